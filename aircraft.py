@@ -1,25 +1,17 @@
 import enum
 import math
-import random
-import threading
 from math import degrees
 
-import pygame
-
-import compiler.data as data
-
 from airport import Airport, Gate
-
-TURN_SPEED = 10  # degree / s
-VERT_SPEED = 30  # ft / s
-ACCEL = 3  # kt / s
+from fleet import ACCEL, TURN_SPEED, VERT_SPEED, FleetField
+from scheduler import Event
 
 TAXI_SPEED = 20  # kt
 TAXI_TURN_SPEED = 2  # kt
 
 MIN_CLEAR_TO_LAND_HEIGHT = 50  # ft
 
-MULTIPLIER = 1
+AIRCRAFT_SIZE = 20  # px
 
 
 class Status(enum.Enum):
@@ -28,33 +20,40 @@ class Status(enum.Enum):
 
 
 class Instruction(enum.Enum):
-    PUSHBACK, TAXI, HOLD, CONTINUE, TAKEOFF, LINE_UP, ABORT, LAND, GO_AROUND = range(9)
+    (PUSHBACK, TAXI, HOLD, CONTINUE, TAKEOFF, LINE_UP, ABORT, LAND, GO_AROUND, CROSS, HEADING, ALTITUDE,
+     SPEED) = range(13)
+
 
+class Aircraft:
+    # kinematic state lives in the fleet of the airport, see fleet.Fleet
+    _x = FleetField("x")
+    _y = FleetField("y")
+    heading = FleetField("heading")
+    _acl_heading = FleetField("acl_heading")
+    speed = FleetField("speed")
+    _acl_speed = FleetField("acl_speed")
+    altitude = FleetField("altitude")
+    _acl_altitude = FleetField("acl_altitude")
 
-class Aircraft(pygame.sprite.Sprite):
     def __init__(self, callsign: str, position: tuple[float, float], heading: float, altitude: float, speed: float,
                  status: Status, airport: Airport):
-        pygame.sprite.Sprite.__init__(self)
-        self.original_image = pygame.image.load('resources/plane.svg').convert_alpha()
-        self.original_image = pygame.transform.smoothscale(self.original_image, (20, 20))
-        font = pygame.font.SysFont("Helvetica", 10)
-        self.text = font.render(callsign, True, (255, 255, 255))
-        self.image = pygame.transform.rotate(self.original_image, 180)
-        self.area = pygame.display.get_surface().get_rect()
-        self.rect = self.image.get_rect()
-        self.rect = self.rect.move(position[0] - 10, position[1] - 10)
         self.callsign = callsign
+        self._fleet = airport.fleet
+        self._slot = airport.fleet.allocate(self)
         self._acl_heading = self.heading = heading
-        self._position: list[float] = list(position)
+        self._x, self._y = position
         self._acl_altitude = self.altitude = altitude
         self._acl_speed = self.speed = speed
         self._status = status
         self._airport = airport
         self.backup_state = (Status.PARKED, 0)
+        # ICAO codes of the airports the flight comes from and goes to, if they are known
+        self.origin: str | None = None
+        self.destination: str | None = None
 
     def _get_heading(self, position: tuple[float, float]) -> float:
-        dx = self._position[0] - position[0]
-        dy = self._position[1] - position[1]
+        dx = self._x - position[0]
+        dy = self._y - position[1]
         if dy == 0:
             tan = 90
         else:
@@ -67,19 +66,46 @@ class Aircraft(pygame.sprite.Sprite):
     def get_status(self) -> Status:
         return self._status
 
+    def get_position(self) -> tuple[float, float]:
+        return self._x, self._y
+
+    def get_heading(self) -> float:
+        return self._acl_heading
+
+    def get_altitude(self) -> float:
+        return self._acl_altitude
+
+    def get_speed(self) -> float:
+        return self._acl_speed
+
+    def get_goals(self) -> list[tuple[float, float]]:
+        return []
+
     def is_landing(self) -> bool:
         return self._status in (Status.LANDING, Status.READY_TO_LAND)
 
     def fly_towards(self, position: tuple[float, float]):
         self.heading = self._get_heading(position)
 
+    def before_move(self):
+        pass
+
+    def after_move(self):
+        pass
+
     def update(self, dt: float):
-        dt = 0.1
+        # moves this aircraft on its own, Airport.update moves all of its aircraft at once
+        self.before_move()
+        self.move(dt)
+        self._airport.aircraft_moved(self)
+        self.after_move()
+
+    def move(self, dt: float):
         # Speed
         if self._acl_speed < self.speed:
-            self._acl_speed += min(self.speed - self._acl_speed, ACCEL * dt) * MULTIPLIER
+            self._acl_speed += min(self.speed - self._acl_speed, ACCEL * dt)
         elif self._acl_speed > self.speed:
-            self._acl_speed -= min(self._acl_speed - self.speed, ACCEL * dt) * MULTIPLIER
+            self._acl_speed -= min(self._acl_speed - self.speed, ACCEL * dt)
 
         if self._acl_speed != 0:
 
@@ -87,59 +113,46 @@ class Aircraft(pygame.sprite.Sprite):
             div_left = (360 + self._acl_heading - self.heading) % 360
             div_right = (360 + self.heading - self._acl_heading) % 360
             if div_left > div_right:
-                self._acl_heading += (
-                            min(self.heading - self._acl_heading, TURN_SPEED * dt * abs(self._acl_speed) * 00.1)
-                            * MULTIPLIER)
+                self._acl_heading += min(self.heading - self._acl_heading,
+                                         TURN_SPEED * dt * abs(self._acl_speed) * 00.1)
             else:
-                self._acl_heading -= (
-                            min(self._acl_heading - self.heading, TURN_SPEED * dt * abs(self._acl_speed) * 00.1)
-                            * MULTIPLIER)
+                self._acl_heading -= min(self._acl_heading - self.heading,
+                                         TURN_SPEED * dt * abs(self._acl_speed) * 00.1)
 
             # Altitude
             if self._acl_altitude < self.altitude:
-                self._acl_altitude += min(self.altitude - self._acl_altitude, VERT_SPEED * dt) * MULTIPLIER
+                self._acl_altitude += min(self.altitude - self._acl_altitude, VERT_SPEED * dt)
             elif self._acl_altitude > self.altitude:
-                self._acl_altitude -= min(self._acl_altitude - self.altitude, VERT_SPEED * dt) * MULTIPLIER
+                self._acl_altitude -= min(self._acl_altitude - self.altitude, VERT_SPEED * dt)
 
-        new_pos = self._calc_new_pos(self.rect, self._acl_heading, self._acl_speed / 10, dt)
+        self._calc_new_pos(self._acl_heading, self._acl_speed / 10, dt)
 
-        if self.area.contains(new_pos):
-            self.rect = new_pos
-        self.image = pygame.transform.rotate(self.original_image, -self._acl_heading)
-        self.rect = self.image.get_rect(center=self.rect.center)
-
-        screen = pygame.display.get_surface()
-        screen.blit(self.image, self.rect)
-        if self._status in (Status.READY_FOR_PUSHBACK, Status.PUSHBACK):
-            screen.blit(self.text, self.rect.move(-(self.text.get_width() - self.rect.width) / 2,
-                                                  4-self.rect.height))
-        elif self._status != Status.PARKED:
-            screen.blit(self.text, self.rect.move(-(self.text.get_width() - self.rect.width) / 2,
-                                                  self.rect.height + self.text.get_height() / 2))
-
-    def _calc_new_pos(self, rect, heading, speed, dt):
+    def _calc_new_pos(self, heading, speed, dt):
         angle = math.radians(heading + 90)
         dx = dt * speed * math.cos(angle)
         dy = dt * speed * math.sin(angle)
-        self._position[0] -= dx * MULTIPLIER
-        self._position[1] -= dy * MULTIPLIER
-        rect.left = self._position[0] - 10
-        rect.top = self._position[1] - 10
-        return rect
+        self._x -= dx
+        self._y -= dy
 
     def is_colliding(self, delta=0) -> bool:
-        for a in self._airport.aircraft:
+        for a in self._airport.aircraft_near(self.get_position(), AIRCRAFT_SIZE + delta):
             a: Aircraft
             if self.callsign == a.callsign or a._status == Status.PARKED:
                 continue
-            if ((a.rect.x - delta) <= self.rect[0] <= (a.rect.x + a.rect.w + delta)
-                    and (a.rect.y - delta) <= self.rect[1] <= (a.rect.y + a.rect.h + delta)):
+            # bounding boxes are AIRCRAFT_SIZE squares centered on the position
+            dx = self._x - a._x
+            dy = self._y - a._y
+            if -delta <= dx <= AIRCRAFT_SIZE + delta and -delta <= dy <= AIRCRAFT_SIZE + delta:
                 return True
         return False
 
     def is_outside_game(self, delta=2000) -> bool:
-        return not (-5000 - delta <= self.rect[0] <= self._airport.surface.get_width() + delta
-                and -delta <= self.rect[1] <= self._airport.surface.get_height() + delta)
+        x = self._x - AIRCRAFT_SIZE / 2
+        y = self._y - AIRCRAFT_SIZE / 2
+        # the map reaches out to the approach point
+        approach_x, approach_y = self._airport.layout.approach
+        return not (min(0, approach_x) - delta <= x <= max(self._airport.width, approach_x) + delta
+                    and min(0, approach_y) - delta <= y <= max(self._airport.height, approach_y) + delta)
 
 
 class AiAircraft(Aircraft):
@@ -148,14 +161,12 @@ class AiAircraft(Aircraft):
         super().__init__(callsign, position, heading, altitude, speed, status, airport)
         self._instruction = None
         self._goal: list[tuple[float, float]] = []
-        self.track = pygame.Surface(pygame.display.get_surface().get_size())
-        self.track.set_colorkey((0, 0, 0))
         self._turn_towards = True
-        self.timer: threading.Timer | None = None
+        self.timer: Event | None = None
 
     @classmethod
     def parked_aircraft(cls, airport: Airport, gate: Gate):
-        aircraft = cls(data.get_random_callsign(),
+        aircraft = cls(airport.allocate_callsign(),
                    gate.get_spawn_point(),
                    180,
                    0,
@@ -166,27 +177,31 @@ class AiAircraft(Aircraft):
 
     @classmethod
     def inbound_aircraft(cls, airport: Airport):
-        a = cls(data.get_random_callsign(),
-                   (-5000, 200),
-                   90,
+        a = cls(airport.allocate_callsign(),
+                   airport.layout.approach,
+                   airport.layout.approach_heading,
                    8400,
                    200,
                    Status.READY_TO_LAND,
                    airport)
         a.altitude = 0
+        a.origin = airport.random_route_airport()
         return a
 
     def start_boarding(self, a = 60, b = 180):
-        if self.timer and self.timer.is_alive():
+        if self.timer and self.timer.is_pending():
             raise RuntimeError("Boarding already started!")
-        t = random.randint(a, b)
+        t = self._airport.rng.randint(a, b)
         print("Boarding aircraft for {} sec".format(t))
-        self.timer = threading.Timer(t, self.boarding_complete_handler)
-        self.timer.start()
+        self.destination = self._airport.random_route_airport()
+        self.timer = self._airport.scheduler.schedule(t, self.boarding_complete_handler)
 
     def boarding_complete_handler(self):
         self._status = Status.READY_FOR_PUSHBACK
 
+    def get_goals(self) -> list[tuple[float, float]]:
+        return self._goal
+
     def fly_towards(self, position: tuple[float, float] = None):
         if position is None:
             position = self._goal[0]
@@ -194,75 +209,87 @@ class AiAircraft(Aircraft):
 
     def set_goal(self, waypoint: str):
         gmap = self._airport.ground_map
-        closest_point = gmap.find_closest(self._position)
+        closest_point = gmap.find_closest(self.get_position())
         path = gmap.get_shortest_path(closest_point, waypoint)
         for point_name in path:
             point = gmap.get_point(point_name)
             self._goal.append((point.x, point.y))
 
-    def set_instruction(self, instruction: Instruction, waypoints: str | list[str]):
+    def set_instruction(self, instruction: Instruction, waypoints: str | list[str]) -> bool:
+        # applies the instruction if the aircraft can follow it in its current state
+        layout = self._airport.layout
         if instruction == Instruction.PUSHBACK and self._status == Status.READY_FOR_PUSHBACK:
             self._turn_towards = False
             self._status = Status.PUSHBACK
-            self._goal.append((self._position[0], self._position[1] - 50))
-            self._goal.append((self._position[0] + 45, 350))
+            self._add_turn(layout.pushback)
             self.speed = -20
+            return True
         elif instruction == Instruction.LINE_UP and self._status == Status.READY_FOR_LINE_UP:
             self._status = Status.LINE_UP
-            self._goal.append((self._position[0], self._position[1] - 25))
-            self._goal.append((self._position[0] + 35, 200))
+            self._add_turn(layout.line_up)
             self.speed = 20
+            return True
         elif instruction == Instruction.TAKEOFF and (self._status == Status.READY_FOR_TAKEOFF or
                                                      self._status == Status.READY_FOR_LINE_UP):
             if self._status == Status.READY_FOR_LINE_UP:
-                self._goal.append((self._position[0], self._position[1] - 25))
-                self._goal.append((self._position[0] + 35, 200))
+                self._add_turn(layout.line_up)
                 self.speed = 20
-            waypoint = self._airport.ground_map.get_point("rw_exit_g")
+            waypoint = self._airport.ground_map.get_point(layout.runway_exit)
             self._goal.append((waypoint.x, waypoint.y))
             self._status = Status.TAKEOFF
+            return True
         elif instruction == Instruction.TAXI and self._status == Status.READY_FOR_TAXI:
+            unknown = [point for point in waypoints if point not in layout.taxi_out]
+            if unknown:
+                raise RuntimeError("No taxi route for {}".format(unknown[0]))
             self._status = Status.TAXI_RUNWAY
             prev = ""
             for point in waypoints:
-                match point:
-                    case 18:
-                        start = "tw_cd"
-                        waypoint = "rw_hold_c"
-                    case "bravo":
-                        start = "tw_bd"
-                        waypoint = "tw_be"
-                    case _:
-                        start = "tw_cd"
-                        waypoint = "tw_ce"
+                start, waypoint = layout.taxi_out[point]
                 prev = self.add_points(start, waypoint, prev)
             self.speed = 20
+            return True
         elif instruction == Instruction.TAXI and self._status == Status.READY_FOR_GATE:
+            gates = ["gate-{}".format(point) for point in waypoints if point not in layout.taxi_in]
+            if not gates or self._airport.ground_map.get_point(gates[-1]) is None:
+                raise RuntimeError("Unknown gate")
             self._status = Status.TAXI_GATE
             prev = ""
             gate = ""
             for point in waypoints:
-                match point:
-                    case "alpha":
-                        start = "rw_hold_g"
-                        waypoint = "tw_ad"
-                    case "bravo":
-                        start = "rw_hold_g"
-                        waypoint = "tw_bd"
-                    case _:
-                        start = "rw_hold_g"
-                        gate = waypoint = "gate-{}".format(point)
+                if point in layout.taxi_in:
+                    start, waypoint = layout.taxi_in[point]
+                else:
+                    start = layout.runway_hold
+                    gate = waypoint = "gate-{}".format(point)
                 prev = self.add_points(start, waypoint, prev)
             g = self._airport.ground_map.get_point(gate)
-            self._goal.append((g.x - 13, g.y + 47))
+            self._goal.append((g.x + layout.gate_stand[0], g.y + layout.gate_stand[1]))
             self.speed = 20
-
+            return True
         elif instruction == Instruction.LAND and self._status == Status.READY_TO_LAND:
             self._status = Status.LANDING
-            wp = self._airport.ground_map.get_point("rw_exit_g")
+            wp = self._airport.ground_map.get_point(layout.runway_exit)
             self._goal.append((wp.x, wp.y))
-            wp = self._airport.ground_map.get_point("rw_hold_g")
+            wp = self._airport.ground_map.get_point(layout.runway_hold)
             self._goal.append((wp.x, wp.y))
+            return True
+        elif instruction == Instruction.HEADING and self._status in (Status.AIRBORNE, Status.GO_AROUND):
+            self.heading = waypoints % 360
+            return True
+        elif instruction == Instruction.ALTITUDE and self._status in (Status.AIRBORNE, Status.GO_AROUND):
+            self.altitude = waypoints
+            return True
+        elif instruction == Instruction.SPEED and self._status in (Status.AIRBORNE, Status.GO_AROUND):
+            self.speed = waypoints
+            return True
+        return False
+
+    def _add_turn(self, turn: dict):
+        # the line up or pushback of the layout, see Layout
+        (via_x, via_y), (dx, y) = turn["via"], turn["to"]
+        self._goal.append((self._x + via_x, self._y + via_y))
+        self._goal.append((self._x + dx, y))
 
     def add_points(self, start, end, prev):
         if prev:
@@ -276,13 +303,13 @@ class AiAircraft(Aircraft):
 
     def _check_goal(self):
         if (len(self._goal) > 0
-                and abs(self._goal[0][0] - self._position[0]) < 5
-                and abs(self._goal[0][1] - self._position[1]) < 5):
+                and abs(self._goal[0][0] - self._x) < 5
+                and abs(self._goal[0][1] - self._y) < 5):
             self._goal.pop(0)
             return True
         return False
 
-    def update(self, dt: float):
+    def before_move(self):
         if self._status in [Status.TAXI_RUNWAY, Status.TAXI_GATE] and self.is_colliding(20):
             self.backup_state = (self._status, self.speed)
             self.speed = 0
@@ -292,13 +319,13 @@ class AiAircraft(Aircraft):
 
         if self._turn_towards and self._goal:
             self.fly_towards()
-        super().update(dt)
 
+    def after_move(self):
         if self._check_goal():
             match self._status:
                 case Status.PUSHBACK:
                     if self._goal:
-                        self.heading = 270
+                        self.heading = self._airport.layout.pushback["heading"]
                     else:
                         self.speed = 0
                         self._turn_towards = True
@@ -332,7 +359,7 @@ class AiAircraft(Aircraft):
                     self.speed = 300
                     self._status = Status.AIRBORNE
         elif self._status == Status.READY_TO_LAND:
-            if self.rect.x > 0:
+            if self._x - AIRCRAFT_SIZE / 2 > 0:
                 self._status = Status.GO_AROUND
                 self.altitude = 10000
                 self.speed = 300
@@ -346,18 +373,3 @@ class AiAircraft(Aircraft):
         if self._status in [Status.READY_TO_LAND, Status.LANDING]:
             if 100 < self._acl_altitude < 2000:
                 self.speed = 160
-
-        self.track = pygame.Surface(pygame.display.get_surface().get_size())
-        self.track.set_colorkey((0, 0, 0))
-        self.track.set_at((int(self._position[0]), int(self._position[1])), pygame.Color("red"))
-        for i, goal in enumerate(self._goal):
-            pygame.draw.rect(self.track, (0, 0, 255), (goal[0] - 5, goal[1] - 5, 10, 10),
-                             10, 5)
-            if i == 0:
-                pygame.draw.line(self.track, (0, 0, 255),
-                                 (goal[0], goal[1]),
-                                 (self._position[0], self._position[1]))
-            else:
-                pygame.draw.line(self.track, (0, 0, 255),
-                                 (goal[0], goal[1]),
-                                 (self._goal[i - 1][0], self._goal[i - 1][1]))
@@ -1,42 +1,203 @@
 import pygame
 import math
-
-from ground_map import GroundMap, Waypoint
+import random
+import re
+import time
+
+import airports
+import assets
+import compiler.data as data
+from compiler.fuzzy import TrigramIndex
+from fleet import Fleet
+from ground_map import GroundMap
+from layout import DEFAULT_LAYOUT, Layout, load_layout
+from scheduler import Scheduler
+from spatial import SpatialHash
 
 RUNWAY_COLOR = (70, 70, 70)  # pygame.Color('blue')
 TAXI_COLOR = (100, 100, 100)  # pygame.Color('red')
 GATE_COLOR = (120, 120, 120)  # pygame.Color('green')
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
+GROUND_COLOR = (40, 40, 40)
 SIZE = 700
+GATE_LABEL_WIDTH = 20
+COLLISION_CELL_SIZE = 64  # px, larger than the biggest collision query box
+HEARD_CALLSIGN = re.compile(r"^(\D*)(\d+)$")
+ROUTE_RADIUS = 1000  # nm around the airport that traffic comes from and goes to
 
 
-# runway (name, length, orientation)
 class Gate:
     def __init__(self, x: int, y: int, name: str):
         self.x: int = x
         self.y: int = y
         self.name: str = name
-        self.text_box = draw_text_box(name)
         self.is_occupied: bool = False
 
     def get_spawn_point(self) -> tuple[int, int]:
-        return int(self.x + self.text_box.get_width() / 2), self.y - 10
+        return int(self.x + GATE_LABEL_WIDTH / 2), self.y - 10
+
+
+# Rows are rendered once per status change. Rows stack upwards from the bottom of the screen, when there are
+# more than fit below the top margin the board is paged with scroll().
+class StatusBoard:
+    ROW_HEIGHT = 20
+    TOP_MARGIN = 100
+
+    def __init__(self, airport: "Airport"):
+        self.airport = airport
+        self.offset = 0
+        self._rows: dict[str, tuple[object, pygame.Surface]] = {}
+        self._more: dict[str, pygame.Surface] = {}
+
+    def rows_per_page(self) -> int:
+        rows = max(3, (self.airport.height - 65 - StatusBoard.TOP_MARGIN) // StatusBoard.ROW_HEIGHT)
+        # two rows are taken by the "more" labels once the list needs paging
+        return rows if len(self.airport.aircraft) <= rows else rows - 2
+
+    def scroll(self, rows: int):
+        last = max(0, len(self.airport.aircraft) - self.rows_per_page())
+        self.offset = min(max(0, self.offset + rows), last)
+
+    def page(self, pages: int):
+        self.scroll(pages * self.rows_per_page())
+
+    def _row(self, aircraft) -> pygame.Surface:
+        state = (aircraft.get_status(), aircraft.origin, aircraft.destination)
+        cached = self._rows.get(aircraft.callsign)
+        if cached is None or cached[0] != state:
+            route = ""
+            if aircraft.destination is not None:
+                route = " to " + aircraft.destination
+            elif aircraft.origin is not None:
+                route = " from " + aircraft.origin
+            cached = (state, draw_text_box(aircraft.callsign + route + ": " + str(state[0]), WHITE, BLACK))
+            self._rows[aircraft.callsign] = cached
+        return cached[1]
+
+    def _more_label(self, text: str) -> pygame.Surface:
+        label = self._more.get(text)
+        if label is None:
+            label = self._more[text] = draw_text_box(text, WHITE, BLACK)
+        return label
+
+    def draw(self, surface: pygame.Surface) -> pygame.Rect | None:
+        aircraft = self.airport.aircraft
+        if len(self._rows) > len(aircraft):
+            active = {a.callsign for a in aircraft}
+            self._rows = {callsign: row for callsign, row in self._rows.items() if callsign in active}
+        self.scroll(0)
+
+        y = self.airport.height - 65
+        drawn = None
+        visible = aircraft[self.offset:self.offset + self.rows_per_page()]
+        labels = [self._row(a) for a in visible]
+        if self.offset > 0:
+            labels.insert(0, self._more_label("v {} more".format(self.offset)))
+        hidden = len(aircraft) - self.offset - len(visible)
+        if hidden > 0:
+            labels.append(self._more_label("^ {} more".format(hidden)))
+        for label in labels:
+            rect = surface.blit(label, (5, y))
+            drawn = rect if drawn is None else drawn.union(rect)
+            y -= StatusBoard.ROW_HEIGHT
+        return drawn
 
 
 class Airport:
-    def __init__(self, surface: pygame.Surface, name: str):
-        self.surface = surface
+    def __init__(self, name: str, size: tuple[int, int] = (1280, 720), seed: int | None = None,
+                 layout: Layout | None = None):
         self.name = name
+        # runways, taxiways, gates and the ground map come from the layout file
+        self.layout = layout if layout is not None else load_layout(DEFAULT_LAYOUT)
+        self.width, self.height = size
+        # all randomness of the simulation comes from here so a seeded airport replays identically
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # timers on game time, the simulation runs them as it advances
+        self.scheduler = Scheduler()
         self.runways = []
         self.taxiways = []
         self.gates = []
         self.aircraft = []
+        # callsign -> aircraft of every aircraft on the airport, callsigns handed out but not yet in use
+        self.callsigns = {}
+        self._reserved_callsigns = set()
+        # spoken names of the airlines of the aircraft here, for callsigns that were misheard
+        self.callsign_matcher = TrigramIndex()
+        self._flight_numbers = {}
+        # ICAO codes of the airports around the one of the layout, once traffic needs them
+        self._route_airports: list[str] | None = None
+        self.aircraft_index = SpatialHash(COLLISION_CELL_SIZE)
+        self.fleet = Fleet(cell_size=COLLISION_CELL_SIZE)
         self.ground_map = GroundMap()
-        self.draw()
+        self.status_board = StatusBoard(self)
+        # profiler.Profiler timing the update of every aircraft while it is enabled
+        self.profiler = None
+        self.build()
+
+    def allocate_callsign(self, attempts: int = 1000) -> str:
+        # random callsign of a real airline that no other aircraft of this airport has
+        for _ in range(attempts):
+            callsign = data.get_random_callsign(self.rng)
+            if callsign not in self.callsigns and callsign not in self._reserved_callsigns:
+                self._reserved_callsigns.add(callsign)
+                return callsign
+        raise RuntimeError("No free callsign after {} attempts".format(attempts))
+
+    def random_route_airport(self) -> str | None:
+        # ICAO code of a random airport with scheduled service within ROUTE_RADIUS of the real airport the
+        # layout stands for, None if it stands for none
+        if self.layout.icao is None:
+            return None
+        if self._route_airports is None:
+            index = airports.load_airports()
+            home = index.find(self.layout.icao)
+            self._route_airports = [] if home is None else [
+                other.icao for _, other in index.within(home.latitude, home.longitude, ROUTE_RADIUS)
+                if other is not home and other.iata is not None and other.icao is not None]
+        return self.rng.choice(self._route_airports) if self._route_airports else None
+
+    def get_aircraft(self, callsign: str):
+        return self.callsigns.get(callsign.upper())
+
+    def find_aircraft(self, callsign: str):
+        # the aircraft with this callsign, otherwise the one with the same flight number whose airline
+        # sounds most like what was heard, "LUFTANZA4713" finds LH4713
+        aircraft = self.get_aircraft(callsign)
+        if aircraft is not None:
+            return aircraft
+        heard = HEARD_CALLSIGN.match(callsign.upper())
+        if heard is None:
+            return None
+        number = int(heard.group(2))
+        for _, candidate in self.callsign_matcher.search(heard.group(1)):
+            if self._flight_numbers[candidate] == number:
+                return self.callsigns[candidate]
+        return None
 
     def add_aircraft(self, aircraft):
+        other = self.callsigns.get(aircraft.callsign)
+        if other is not None and other is not aircraft:
+            raise RuntimeError("Callsign {} is already in use".format(aircraft.callsign))
+        self._reserved_callsigns.discard(aircraft.callsign)
+        self.callsigns[aircraft.callsign] = aircraft
+        airline, number = data.split_callsign(aircraft.callsign)
+        if airline is not None:
+            self._flight_numbers[aircraft.callsign] = number
+            for name in (airline.callsign, airline.iata, airline.icao):
+                if name:
+                    self.callsign_matcher.add(name, aircraft.callsign)
         self.aircraft.append(aircraft)
+        self.fleet.attach(aircraft)
+        self.aircraft_index.insert(aircraft, aircraft.get_position())
+
+    def aircraft_moved(self, aircraft):
+        if aircraft in self.aircraft_index:
+            self.aircraft_index.move(aircraft, aircraft.get_position())
+
+    def aircraft_near(self, position: tuple[float, float], radius: float):
+        return self.aircraft_index.query(position, radius)
 
     def number_of_landing_aircraft(self):
         cnt = 0
@@ -45,162 +206,85 @@ class Airport:
                 cnt += 1
         return cnt
 
-    def update(self, *args):
+    def remove_aircraft(self, aircraft):
+        self.aircraft.remove(aircraft)
+        del self.callsigns[aircraft.callsign]
+        self._flight_numbers.pop(aircraft.callsign, None)
+        self.callsign_matcher.remove(aircraft.callsign)
+        self.aircraft_index.remove(aircraft)
+        self.fleet.detach(aircraft)
+
+    def update(self, dt: float):
+        # all aircraft decide, then the fleet moves them in one step
+        if self.profiler is not None and self.profiler.enabled:
+            self._profiled_update(dt)
+            return
         for aircraft in self.aircraft:
-            aircraft.update(*args)
-
-    def draw(self):
-        length = 700
-        start = (self.surface.get_width() - length) / 2
-
-        # gate
-        pygame.draw.rect(self.surface, GATE_COLOR, (start + 100, 347, length - 200, 100))
-        # taxiways
-        pygame.draw.line(self.surface, TAXI_COLOR, (start, 270), (start + length, 270), 15)
-        self.draw_round_intersection((start + 6, 204), False, False, True, True)
-        self.draw_round_intersection((start + length / 2, 204), False, False, True, True)
-        self.draw_round_intersection((start + length - 1, 204), False, False, True, True)
-
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + 25, 350), (start + length - 19, 350), 15)
-        # left
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + 6, 210), (start + 6, 332), 15)
-        self.draw_corner(start + 6, 332, True, True)
-        self.draw_round_intersection((start + 6, 270), False, True, False, True)
-        # right
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + length, 210), (start + length, 332), 15)
-        self.draw_corner(start + length, 332, False, True)
-        self.draw_round_intersection((start + length - 1, 270), True, False, True, False)
-        # center
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + length / 2, 210), (start + length / 2, 345), 15)
-        self.draw_corner(start + length / 2, 330, True, True)
-        self.draw_corner(start + length / 2, 330, False, True)
-        self.draw_round_intersection((start + length / 2, 270), True, True, True, True)
-        # diagonal
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + length / 4, 210), (start + length / 6, 270), 20)
-        self.draw_corner(start + length / 4 - 10, 205, False, False)
-        self.draw_corner(start + length / 6 + 15, 251, True, True)
-        pygame.draw.line(self.surface, TAXI_COLOR, (start + 3 * length / 4, 210), (start + 5 * length / 6, 270), 20)
-        self.draw_corner(start + 3 * length / 4 + 10, 205, True, False)
-        self.draw_corner(start + 5 * length / 6 - 15, 251, False, True)
-
-        # runways
-        self.draw_runway(800, 200, 18)
-
-        draw_text("C", 290, 230, self.surface)
-        draw_text("F", 435, 230, self.surface)
-        draw_text("B", 635, 230, self.surface)
-        draw_text("G", 830, 230, self.surface)
-        draw_text("A", 985, 230, self.surface)
-
-        draw_text("E", 350, 263, self.surface)
-        draw_text("E", 530, 263, self.surface)
-        draw_text("E", 750, 263, self.surface)
-        draw_text("E", 930, 263, self.surface)
-
-        draw_text("C", 290, 300, self.surface)
-        draw_text("B", 635, 300, self.surface)
-        draw_text("A", 985, 300, self.surface)
-
-        draw_text("D", 350, 343, self.surface)
-        draw_text("D", 930, 343, self.surface)
-
-        self.gates = [Gate(400, 410, "B1"),
-                      Gate(430, 410, "B2"),
-                      Gate(460, 410, "B3"),
-                      Gate(490, 410, "B4"),
-                      Gate(520, 410, "B5"),
-                      Gate(550, 410, "B6"),
-                      Gate(580, 410, "B7"),
-                      Gate(700, 410, "A1"),
-                      Gate(730, 410, "A2"),
-                      Gate(760, 410, "A3"),
-                      Gate(790, 410, "A4"),
-                      Gate(820, 410, "A5"),
-                      Gate(850, 410, "A6"), ]
-
-        for gate in self.gates:
-            self.surface.blit(gate.text_box, (gate.x, gate.y))
-
-        self.ground_map.add_point(Waypoint("rw_exit_c", 295, 200, ["rw_exit_f", "rw_hold_c"]))
-        self.ground_map.add_point(Waypoint("rw_exit_f", 455, 200, ["rw_exit_c", "rw_exit_b", "rw_hold_f"]))
-        self.ground_map.add_point(Waypoint("rw_exit_b", 638, 200, ["rw_exit_f", "rw_exit_g", "rw_hold_b"]))
-        self.ground_map.add_point(Waypoint("rw_exit_g", 810, 200, ["rw_exit_b", "rw_exit_a", "rw_hold_g"]))
-        self.ground_map.add_point(Waypoint("rw_exit_a", 988, 200, ["rw_exit_g", "rw_hold_a"]))
-
-        self.ground_map.add_point(Waypoint("rw_hold_c", 295, 240, ["rw_exit_c", "tw_ce"]))
-        self.ground_map.add_point(Waypoint("rw_hold_f", 437, 240, ["rw_exit_f", "tw_fe"]))
-        self.ground_map.add_point(Waypoint("rw_hold_b", 638, 240, ["rw_exit_b", "tw_be"]))
-        self.ground_map.add_point(Waypoint("rw_hold_g", 842, 240, ["rw_exit_g", "tw_ge"]))
-        self.ground_map.add_point(Waypoint("rw_hold_a", 988, 240, ["rw_exit_a", "tw_ae"]))
-
-        self.ground_map.add_point(Waypoint("tw_ce", 298, 270, ["rw_hold_c", "tw_fe", "tw_cd"]))
-        self.ground_map.add_point(Waypoint("tw_fe", 417, 270, ["rw_hold_f", "tw_ce", "tw_be"]))
-        self.ground_map.add_point(Waypoint("tw_be", 641, 270, ["rw_hold_b", "tw_fe", "tw_ge", "tw_bd"]))
-        self.ground_map.add_point(Waypoint("tw_ge", 864, 270, ["rw_hold_g", "tw_be", "tw_ae"]))
-        self.ground_map.add_point(Waypoint("tw_ae", 987, 270, ["rw_hold_a", "tw_ge", "tw_ad"]))
-
-        self.ground_map.add_point(Waypoint("tw_cd", 303, 350, ["tw_ce", "tw_bd"]))
-        self.ground_map.add_point(Waypoint("tw_bd", 638, 350, ["tw_cd", "tw_ad", "tw_be"]))
-        self.ground_map.add_point(Waypoint("tw_ad", 983, 350, ["tw_bd", "tw_ae"]))
+            aircraft.before_move()
+        for aircraft in self.fleet.step(dt):
+            self.aircraft_moved(aircraft)
+        for aircraft in self.aircraft:
+            aircraft.after_move()
 
-        for gate in self.gates:
-            name = "gate-{}".format(gate.name.lower())
-            if "a" in gate.name.lower():
-                self.ground_map.add_point(Waypoint(name, gate.x + 18, gate.y - 58, ["tw_ad"]))
-                self.ground_map.get_point("tw_ad").connected_points.append(name)
-            else:
-                self.ground_map.add_point(Waypoint(name, gate.x + 18, gate.y - 58, ["tw_bd"]))
-                self.ground_map.get_point("tw_bd").connected_points.append(name)
-
-    def draw_corner(self, start_x, start_y, right: bool, top: bool):
-        if right and top:
-            pygame.draw.arc(self.surface, TAXI_COLOR,
-                            (start_x - 6, start_y - 24, 50, 50),
-                            math.pi, 3 * math.pi / 2, 15)
-        elif not right and top:
-            pygame.draw.arc(self.surface, TAXI_COLOR,
-                            (start_x - 42, start_y - 24, 50, 50),
-                            3 * math.pi / 2, 2 * math.pi, 15)
-        elif right and not top:
-            pygame.draw.arc(self.surface, TAXI_COLOR,
-                            (start_x - 7, start_y - 7, 50, 50),
-                            math.pi / 2, math.pi, 15)
-        elif not right and not top:
-            pygame.draw.arc(self.surface, TAXI_COLOR,
-                            (start_x - 42, start_y - 7, 50, 50),
-                            2 * math.pi, math.pi / 2, 15)
-
-    def draw_round_intersection(self, pos, tl: bool, tr: bool, bl: bool, br: bool):
-        if tl:
-            self.draw_corner(pos[0], pos[1] - 19, False, True)
-        if tr:
-            self.draw_corner(pos[0], pos[1] - 19, True, True)
-        if bl:
-            self.draw_corner(pos[0], pos[1] + 2, False, False)
-        if br:
-            self.draw_corner(pos[0], pos[1] + 2, True, False)
-
-    def draw_runway(self, length, y_pos, orientation):
-        start = (self.surface.get_width() - length) / 2
-        pygame.draw.line(self.surface, RUNWAY_COLOR, (start, y_pos), (start + length, y_pos), 20)
-        text = draw_text_box("RWY %d" % orientation, angle=90)
-        self.surface.blit(text, (start, y_pos - text.get_height() / 2))
-        text = draw_text_box("RWY %d" % (orientation + 18), angle=90)
-        self.surface.blit(text, (start + length, y_pos - text.get_height() / 2))
-
-    def draw_aircraft_status(self, surface: pygame.Surface):
-        offset = 0
+    def _profiled_update(self, dt: float):
+        # update() with the time every aircraft takes to decide, kept apart so it costs nothing when off
+        start = time.perf_counter()
+        spent = {}
+        for aircraft in self.aircraft:
+            before = time.perf_counter()
+            aircraft.before_move()
+            spent[aircraft] = time.perf_counter() - before
+        for aircraft in self.fleet.step(dt):
+            self.aircraft_moved(aircraft)
         for aircraft in self.aircraft:
-            draw_text(aircraft.callsign + ": " + str(aircraft.get_status()), 5, self.surface.get_height() - 65 - offset,
-                      surface)
-            offset += 20
+            before = time.perf_counter()
+            aircraft.after_move()
+            self.profiler.add_aircraft(aircraft.callsign, spent.get(aircraft, 0.0) + time.perf_counter() - before)
+        self.profiler.add("update", time.perf_counter() - start)
+
+    def draw(self, surface: pygame.Surface):
+        layout = self.layout
+        for apron in layout.aprons:
+            pygame.draw.rect(surface, GATE_COLOR, apron)
+        for taxiway in layout.taxiways:
+            pygame.draw.line(surface, TAXI_COLOR, taxiway["from"], taxiway["to"], taxiway["width"])
+        for curve in layout.curves:
+            pygame.draw.arc(surface, TAXI_COLOR, curve["rect"],
+                            math.radians(curve["from"]), math.radians(curve["to"]), curve["width"])
+        for runway in layout.runways:
+            draw_runway(surface, runway)
+        for label in layout.labels:
+            draw_text(label["text"], *label["at"], surface)
+        for gate in self.gates:
+            surface.blit(draw_text_box(gate.name), (gate.x, gate.y))
+
+    def background(self) -> pygame.Surface:
+        # the static part of the airport, drawn once per layout file and size and cached on disk
+        size = (self.width, self.height)
+        background = self.layout.load_background(size)
+        if background is None:
+            background = pygame.Surface(size)
+            if pygame.display.get_surface() is not None:
+                background = background.convert()
+            background.fill(GROUND_COLOR)
+            self.draw(background)
+            self.layout.save_background(background)
+        return background
+
+    def build(self):
+        self.gates = [Gate(*gate["at"], gate["name"]) for gate in self.layout.gates]
+        self.layout.build_ground_map(self.ground_map)
+        self.ground_map.precompute_routes()
+
+    def draw_aircraft_status(self, surface: pygame.Surface) -> pygame.Rect | None:
+        return self.status_board.draw(surface)
 
 
 def draw_text_box(text: str,
                   text_color: tuple[int, int, int] = BLACK,
                   background_color: tuple[int, int, int] = WHITE,
                   angle: int = 0) -> pygame.Surface:
-    font = pygame.font.SysFont("Helvetica", 12)
+    font = assets.cache.font(assets.FONT_NAME, 12)
     text = font.render(text, True, text_color)
     text = pygame.transform.rotate(text, angle)
     text_surface = pygame.Surface((text.get_width() + 5, text.get_height() + 5))
@@ -211,6 +295,14 @@ def draw_text_box(text: str,
     return text_surface
 
 
-def draw_text(text: str, x: int, y: int, surface: pygame.Surface):
+def draw_text(text: str, x: int, y: int, surface: pygame.Surface) -> pygame.Rect:
     text = draw_text_box(text, WHITE, BLACK)
-    surface.blit(text, (x, y))
+    return surface.blit(text, (x, y))
+
+
+def draw_runway(surface: pygame.Surface, runway: dict):
+    # the runway with the name of each direction at the end it starts from
+    pygame.draw.line(surface, RUNWAY_COLOR, runway["from"], runway["to"], runway["width"])
+    for end, name in zip((runway["from"], runway["to"]), runway["names"]):
+        text = draw_text_box(name, angle=90)
+        surface.blit(text, (end[0], end[1] - text.get_height() / 2))
@@ -0,0 +1,320 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+
+AIRPORTS_CSV = "resources/airports.csv"
+AIRPORT_INDEX = "resources/airports.idx"
+MAGIC = b"ATCP"
+VERSION = 1
+FIELDS = ("iata", "icao")
+SEPARATOR = "\x1f"
+PLACEHOLDERS = ("", "-", "N/A", "\\N")
+EARTH_RADIUS = 3440.065  # nm
+
+# magic, version, SHA-1 of the CSV the index was built from, number of records, number of keys per field
+HEADER = struct.Struct("<4sH20sI" + "I" * len(FIELDS))
+# position on the unit sphere, latitude and longitude in degrees, altitude in ft, offset and length of the
+# strings in the string section
+RECORD = struct.Struct("<3d2diIH")
+POINT = struct.Struct("<3d")
+# offset and length of a key in the string section, record the key belongs to
+KEY = struct.Struct("<IBH")
+
+
+class AirportRecord:
+    __slots__ = ("name", "city", "country", "iata", "icao", "latitude", "longitude", "altitude", "utc_offset",
+                 "dst", "timezone")
+
+    def __init__(self, name: str, city: str, country: str, iata: str, icao: str, latitude: float,
+                 longitude: float, altitude: int, utc_offset: str, dst: str, timezone: str):
+        # placeholders of the data set are stored as None
+        self.name: str = name
+        self.city: str | None = city if city not in PLACEHOLDERS else None
+        self.country: str | None = country if country not in PLACEHOLDERS else None
+        self.iata: str | None = iata if iata not in PLACEHOLDERS else None
+        self.icao: str | None = icao if icao not in PLACEHOLDERS else None
+        self.latitude: float = latitude
+        self.longitude: float = longitude
+        self.altitude: int = altitude
+        self.utc_offset: float | None = float(utc_offset) if utc_offset not in PLACEHOLDERS else None
+        self.dst: str | None = dst if dst not in PLACEHOLDERS else None
+        self.timezone: str | None = timezone if timezone not in PLACEHOLDERS else None
+
+    def __repr__(self):
+        return "{} ({})".format(self.name, self.icao or self.iata)
+
+
+def to_point(latitude: float, longitude: float) -> tuple[float, float, float]:
+    # position on the unit sphere, the straight line between two of them grows with the great circle
+    # distance, so the tree needs no special case for the poles or the date line
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord(distance: float) -> float:
+    return 2 * math.sin(min(distance / EARTH_RADIUS, math.pi) / 2)
+
+
+def arc(chord_length: float) -> float:
+    return 2 * EARTH_RADIUS * math.asin(min(chord_length / 2, 1.0))
+
+
+def distance(a: AirportRecord, b: AirportRecord) -> float:
+    # great circle distance in nm
+    return arc(math.dist(to_point(a.latitude, a.longitude), to_point(b.latitude, b.longitude)))
+
+
+# Compiled airport data, memory mapped. The records are stored in the order of an implicit k-d tree over
+# their position on the unit sphere: the record in the middle of a range splits it on the axis of its
+# depth, x, y, z, x, ... Radius and nearest queries walk the tree in place and code lookups binary search
+# the key tables like compiler.airline_index, so only the records a query returns are decoded. Given the
+# data of an index, see compile_index, it is read from memory instead of the file at path.
+class AirportIndex:
+    def __init__(self, path: str = AIRPORT_INDEX, data: bytes | None = None):
+        if data is not None:
+            self._map = data
+        else:
+            with open(path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.digest, self.count, *key_counts = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("{} is not an airport index of version {}".format(path, VERSION))
+        self._records_offset = HEADER.size
+        self._tables: dict[str, tuple[int, int]] = {}
+        offset = self._records_offset + self.count * RECORD.size
+        for field, count in zip(FIELDS, key_counts):
+            self._tables[field] = (offset, count)
+            offset += count * KEY.size
+        self._strings_offset = offset
+        self._airports: dict[int, AirportRecord] = {}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (self.record(i) for i in range(self.count))
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_offset + offset
+        return self._map[start:start + length]
+
+    def _point(self, i: int) -> tuple[float, float, float]:
+        return POINT.unpack_from(self._map, self._records_offset + i * RECORD.size)
+
+    def record(self, i: int) -> AirportRecord:
+        # decoded once, so every query returning an airport returns the same object
+        airport = self._airports.get(i)
+        if airport is None:
+            *_, latitude, longitude, altitude, offset, length = RECORD.unpack_from(
+                self._map, self._records_offset + i * RECORD.size)
+            name, city, country, iata, icao, utc_offset, dst, timezone = \
+                self._string(offset, length).decode().split(SEPARATOR)
+            airport = self._airports[i] = AirportRecord(name, city, country, iata, icao, latitude, longitude,
+                                                        altitude, utc_offset, dst, timezone)
+        return airport
+
+    def lookup(self, field: str, key: str) -> AirportRecord | None:
+        wanted = key.upper().encode()
+        table, count = self._tables[field]
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, record = KEY.unpack_from(self._map, table + middle * KEY.size)
+            found = self._string(offset, length)
+            if found == wanted:
+                return self.record(record)
+            if found < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def find(self, code: str) -> AirportRecord | None:
+        # IATA codes have three letters, ICAO codes four
+        return self.lookup("iata" if len(code) == 3 else "icao", code)
+
+    def within(self, latitude: float, longitude: float, radius: float) -> list[tuple[float, AirportRecord]]:
+        # distance in nm and airport of every airport at most radius nm away, nearest first
+        target = to_point(latitude, longitude)
+        limit = chord(radius) ** 2
+        found = []
+        ranges = [(0, self.count, 0)]
+        while ranges:
+            low, high, depth = ranges.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            point = self._point(middle)
+            squared = sum((a - b) ** 2 for a, b in zip(target, point))
+            if squared <= limit:
+                found.append((squared, middle))
+            axis = depth % 3
+            delta = target[axis] - point[axis]
+            near, far = ((low, middle), (middle + 1, high)) if delta < 0 else ((middle + 1, high), (low, middle))
+            ranges.append((*near, depth + 1))
+            if delta * delta <= limit:
+                ranges.append((*far, depth + 1))
+        return [(arc(math.sqrt(squared)), self.record(i)) for squared, i in sorted(found)]
+
+    def nearest(self, latitude: float, longitude: float, count: int = 1) -> list[tuple[float, AirportRecord]]:
+        # distance in nm and airport of the count airports closest to the position, nearest first
+        if count <= 0:
+            return []
+        target = to_point(latitude, longitude)
+        # max heap of the best so far by negated squared distance
+        best: list[tuple[float, int]] = []
+
+        def visit(low: int, high: int, depth: int):
+            if low >= high:
+                return
+            middle = (low + high) // 2
+            point = self._point(middle)
+            squared = sum((a - b) ** 2 for a, b in zip(target, point))
+            if len(best) < count:
+                heapq.heappush(best, (-squared, middle))
+            elif squared < -best[0][0]:
+                heapq.heapreplace(best, (-squared, middle))
+            axis = depth % 3
+            delta = target[axis] - point[axis]
+            near, far = ((low, middle), (middle + 1, high)) if delta < 0 else ((middle + 1, high), (low, middle))
+            visit(*near, depth + 1)
+            if len(best) < count or delta * delta < -best[0][0]:
+                visit(*far, depth + 1)
+
+        visit(0, self.count, 0)
+        return [(arc(math.sqrt(-squared)), self.record(i)) for squared, i in sorted(best, reverse=True)]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def csv_digest(path: str = AIRPORTS_CSV) -> bytes:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).digest()
+
+
+def read_rows(path: str = AIRPORTS_CSV) -> list[list[str]]:
+    with open(path, newline='', encoding="utf-8") as csvfile:
+        rows = csv.reader(csvfile, delimiter=',')
+        next(rows, None)  # header
+        return [row for row in rows if len(row) == 11]
+
+
+def tree_order(points: list[tuple[float, float, float]], indices: list[int], depth: int = 0) -> list[int]:
+    # indices in the order of a balanced implicit k-d tree, the median of a range on the axis of its depth
+    # is in its middle, the smaller ones before it and the larger ones after it
+    if not indices:
+        return []
+    axis = depth % 3
+    indices = sorted(indices, key=lambda i: points[i][axis])
+    middle = len(indices) // 2
+    return (tree_order(points, indices[:middle], depth + 1) + [indices[middle]]
+            + tree_order(points, indices[middle + 1:], depth + 1))
+
+
+def compile_index(csv_path: str = AIRPORTS_CSV) -> bytes:
+    rows = read_rows(csv_path)
+    points = [to_point(float(row[5]), float(row[6])) for row in rows]
+    order = tree_order(points, list(range(len(rows))))
+    strings = bytearray()
+
+    def add_string(value: str) -> tuple[int, int]:
+        data = value.encode()
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    records = bytearray()
+    # key -> position in the index, where airports share a key the first one of the CSV wins
+    tables: dict[str, dict[str, tuple[int, int]]] = {field: {} for field in FIELDS}
+    for position, i in enumerate(order):
+        name, city, country, iata, icao, latitude, longitude, altitude, utc_offset, dst, timezone = rows[i]
+        value = SEPARATOR.join((name, city, country, iata, icao, utc_offset, dst, timezone))
+        records.extend(RECORD.pack(*points[i], float(latitude), float(longitude), int(altitude),
+                                   *add_string(value)))
+        for field, code in zip(FIELDS, (iata.upper(), icao.upper())):
+            if code not in PLACEHOLDERS and (code not in tables[field] or i < tables[field][code][0]):
+                tables[field][code] = (i, position)
+
+    keys = bytearray()
+    for field in FIELDS:
+        for key, (_, position) in sorted(tables[field].items(), key=lambda item: item[0].encode()):
+            keys.extend(KEY.pack(*add_string(key), position))
+
+    header = HEADER.pack(MAGIC, VERSION, csv_digest(csv_path), len(rows),
+                         *(len(tables[field]) for field in FIELDS))
+    return bytes(header + records + keys + strings)
+
+
+def build(csv_path: str = AIRPORTS_CSV, path: str = AIRPORT_INDEX) -> int:
+    data = compile_index(csv_path)
+    # written next to the index and renamed, so a reader never sees half a file
+    with open(path + ".tmp", "wb") as file:
+        file.write(data)
+    os.replace(path + ".tmp", path)
+    return HEADER.unpack_from(data)[3]
+
+
+def open_index(csv_path: str = AIRPORTS_CSV, path: str = AIRPORT_INDEX) -> AirportIndex | None:
+    # the index if it exists and was built from the current CSV, None otherwise
+    if not os.path.exists(path):
+        return None
+    try:
+        index = AirportIndex(path)
+    except (RuntimeError, struct.error, ValueError) as e:
+        print("Ignoring airport index:", e)
+        return None
+    if index.digest != csv_digest(csv_path):
+        print("Airport index {} is out of date, rebuild it with python airports.py".format(path))
+        index.close()
+        return None
+    return index
+
+
+airports: AirportIndex | None = None
+
+
+def load_airports() -> AirportIndex:
+    # the compiled index if it matches the CSV, otherwise the CSV compiled in memory. Nothing is written
+    # here, compiling the index is the offline step of python airports.py.
+    global airports
+    if airports is None:
+        airports = open_index()
+        if airports is None:
+            airports = AirportIndex(AIRPORTS_CSV, compile_index())
+    return airports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the airport data and query it.")
+    parser.add_argument("code", nargs="?", help="IATA or ICAO code of the airport to search around")
+    parser.add_argument("--radius", type=float, default=100, help="nm around the airport")
+    parser.add_argument("--nearest", type=int, default=5, help="number of closest airports")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build()
+    print("Compiled {} airports into {} ({} bytes) in {:.0f} ms".format(
+        count, AIRPORT_INDEX, os.path.getsize(AIRPORT_INDEX), (time.perf_counter() - start) * 1000))
+    if args.code is None:
+        return
+    index = load_airports()
+    airport = index.find(args.code)
+    if airport is None:
+        print("No airport", args.code)
+        return
+    print(airport, "at {:.4f}, {:.4f}".format(airport.latitude, airport.longitude))
+    found = index.within(airport.latitude, airport.longitude, args.radius)
+    print("{} airports within {} nm".format(len(found), args.radius))
+    for nm, other in index.nearest(airport.latitude, airport.longitude, args.nearest + 1)[1:]:
+        print("{:>8.1f} nm  {}".format(nm, other))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import pygame
+
+PLANE_IMAGE = 'resources/plane.svg'
+PLANE_SIZE = (20, 20)
+
+FONT_NAME = "Helvetica"
+FONT_SIZES = (10, 12, 20, 36)
+
+
+class AssetCache:
+    KINDS = ("image", "sprite", "font")
+
+    def __init__(self):
+        self._images: dict[str, pygame.Surface] = {}
+        self._sprites: dict[tuple[str, tuple[int, int]], pygame.Surface] = {}
+        self._fonts: dict[tuple[str, int], pygame.font.Font] = {}
+        self.hits = dict.fromkeys(AssetCache.KINDS, 0)
+        self.misses = dict.fromkeys(AssetCache.KINDS, 0)
+
+    def image(self, path: str) -> pygame.Surface:
+        image = self._images.get(path)
+        if image is None:
+            self.misses["image"] += 1
+            # convert_alpha needs a display, images loaded before set_mode stay unconverted
+            image = pygame.image.load(path)
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha()
+            self._images[path] = image
+        else:
+            self.hits["image"] += 1
+        return image
+
+    def sprite(self, path: str, size: tuple[int, int]) -> pygame.Surface:
+        key = (path, size)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            self.misses["sprite"] += 1
+            sprite = pygame.transform.smoothscale(self.image(path), size)
+            self._sprites[key] = sprite
+        else:
+            self.hits["sprite"] += 1
+        return sprite
+
+    def font(self, name: str, size: int) -> pygame.font.Font:
+        key = (name, size)
+        font = self._fonts.get(key)
+        if font is None:
+            self.misses["font"] += 1
+            font = pygame.font.SysFont(name, size)
+            self._fonts[key] = font
+        else:
+            self.hits["font"] += 1
+        return font
+
+    def preload(self):
+        for size in FONT_SIZES:
+            self.font(FONT_NAME, size)
+        self.sprite(PLANE_IMAGE, PLANE_SIZE)
+
+    def clear(self):
+        self._images.clear()
+        self._sprites.clear()
+        self._fonts.clear()
+
+    def __str__(self):
+        return ", ".join("{}: {} hits / {} misses".format(kind, self.hits[kind], self.misses[kind])
+                         for kind in AssetCache.KINDS)
+
+
+cache = AssetCache()
@@ -0,0 +1,60 @@
+# Per-frame cost of the ground collision checks with many taxiing aircraft.
+# Run from the repository root: python -m benchmarks.collision
+import random
+import time
+
+from aircraft import AiAircraft, Status
+from airport import Airport
+
+COUNTS = (10, 100, 1000)
+FRAMES = 20
+DENSITY = 2000  # px² of apron per aircraft, roughly a busy taxiway system
+
+
+def make_airport(count: int, rng: random.Random) -> Airport:
+    side = (count * DENSITY) ** 0.5
+    airport = Airport("Benchmark", (int(side), int(side)))
+    for i in range(count):
+        aircraft = AiAircraft("BM{}".format(i), (rng.uniform(0, side), rng.uniform(0, side)),
+                              rng.uniform(0, 360), 0, 20, Status.TAXI_RUNWAY, airport)
+        airport.add_aircraft(aircraft)
+    return airport
+
+
+def linear_is_colliding(aircraft: AiAircraft, delta: float) -> bool:
+    # the check as it was before the spatial index, for comparison
+    size = 20
+    for a in aircraft._airport.aircraft:
+        if aircraft.callsign == a.callsign or a.get_status() == Status.PARKED:
+            continue
+        dx = aircraft._x - a._x
+        dy = aircraft._y - a._y
+        if -delta <= dx <= size + delta and -delta <= dy <= size + delta:
+            return True
+    return False
+
+
+def frame_cost(airport: Airport, check) -> float:
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        for aircraft in airport.aircraft:
+            # AiAircraft.update checks up to twice per frame
+            check(aircraft, 20)
+            check(aircraft, 20)
+            aircraft._calc_new_pos(aircraft.heading, 2, 0.1)
+            airport.aircraft_moved(aircraft)
+    return (time.perf_counter() - start) / FRAMES
+
+
+def main():
+    rng = random.Random(0)
+    print("{:>6} {:>14} {:>14} {:>8}".format("N", "linear ms", "grid ms", "speedup"))
+    for count in COUNTS:
+        airport = make_airport(count, rng)
+        linear = frame_cost(airport, linear_is_colliding)
+        grid = frame_cost(airport, AiAircraft.is_colliding)
+        print("{:>6} {:>14.3f} {:>14.3f} {:>7.1f}x".format(count, linear * 1000, grid * 1000, linear / grid))
+
+
+if __name__ == '__main__':
+    main()
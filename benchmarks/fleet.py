@@ -0,0 +1,48 @@
+# Airport.update with thousands of airborne and taxiing aircraft, NumPy columns against plain lists.
+# Run from the repository root: python -m benchmarks.fleet
+import random
+import time
+
+from aircraft import AiAircraft, Status
+from airport import COLLISION_CELL_SIZE, Airport
+from fleet import Fleet, np
+
+COUNTS = (100, 1000, 5000)
+TICKS = 50
+AREA = (20000, 20000)  # px
+
+
+def make_airport(count: int, vectorized: bool) -> Airport:
+    rng = random.Random(0)
+    airport = Airport("Benchmark", AREA)
+    airport.fleet = Fleet(vectorized=vectorized, cell_size=COLLISION_CELL_SIZE)
+    for i in range(count):
+        # every other aircraft is airborne, the others taxi
+        airborne = i % 2 == 1
+        aircraft = AiAircraft("BM{}".format(i), (rng.uniform(0, AREA[0]), rng.uniform(0, AREA[1])),
+                              rng.uniform(0, 360), 10000 if airborne else 0, 300 if airborne else 20,
+                              Status.AIRBORNE if airborne else Status.TAXI_RUNWAY, airport)
+        aircraft.heading = rng.uniform(0, 360)
+        airport.add_aircraft(aircraft)
+    return airport
+
+
+def tick_time(airport: Airport) -> float:
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        airport.update(0.1)
+    return (time.perf_counter() - start) / TICKS
+
+
+def main():
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+    print("{:>6} {:>12} {:>12} {:>8}".format("N", "lists ms", "numpy ms", "speedup"))
+    for count in COUNTS:
+        lists = tick_time(make_airport(count, False))
+        arrays = tick_time(make_airport(count, True))
+        print("{:>6} {:>12.2f} {:>12.2f} {:>7.1f}x".format(count, lists * 1000, arrays * 1000, lists / arrays))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Tokenizing a corpus of controller phrases, the master pattern lexer against the former word splitting one.
+# Checks the spelled numbers and the matching of misheard callsigns of voice input first.
+# Run from the repository root: python -m benchmarks.lexer
+import random
+import re
+import time
+
+from aircraft import AiAircraft, Status
+from airport import Airport
+from compiler.lexer import KEYWORDS, Lexer, Token, TokenType
+from compiler.parser import Parser
+
+PHRASES = 100000
+TEMPLATES = (
+    "{callsign} good morning cleared to land runway 18 left",
+    "{callsign} line up and wait runway 18",
+    "{callsign} cleared for takeoff runway 18 wind 270",
+    "good afternoon {callsign} taxi to gate {gate} via alpha bravo",
+    "{callsign} go around",
+    "flight {callsign} hold short runway 18",
+    "{callsign} clear pushback",
+    "{callsign} taxi to runway 18 via charlie",
+)
+CALLSIGNS = ("lufthansa {}", "LH{}", "speedbird {}", "dlh{}", "ryanair {}")
+# spoken numbers and what they lex to
+SPELLED_NUMBERS = {"five hundred five": 505, "three thousand five hundred five": 3505, "three five zero": 350,
+                   "five hundred": 500, "two one thousand": 21000, "one thousand two hundred": 1200}
+# phrases with spelled numbers and what they parse to
+SPELLED_PHRASES = {"lufthansa five hundred five climb to three thousand five hundred": ("LH505", 3500),
+                   "lufthansa five hundred five line up and wait runway one eight left": ("LH505", "18l")}
+# aircraft on the airport, a misheard callsign that is as similar to all of them and the one it has to find
+TIED_CALLSIGNS = (("LH4713", "DLH4713"), "LUFTHANZA4713", "DLH4713")
+
+
+def make_corpus(rng: random.Random) -> list[str]:
+    corpus = []
+    for _ in range(PHRASES):
+        callsign = rng.choice(CALLSIGNS).format(rng.randint(1, 9999))
+        gate = rng.choice("abc") + str(rng.randint(1, 12))
+        corpus.append(rng.choice(TEMPLATES).format(callsign=callsign, gate=gate))
+    return corpus
+
+
+def word_lexer(string: str) -> list[Token]:
+    # the lexer as it was before the master pattern, including the pre-pass its callers ran
+    words = re.sub(r"([a-zA-Z]+)(\d+)", r"\1 \2", string).lower().strip().split()
+    tokens = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        following = words[i + 1] if i + 1 < len(words) else None
+        if word in KEYWORDS:
+            tokens.append(Token(KEYWORDS[word], word))
+        elif word in ("clear", "cleared"):
+            tokens.append(Token(TokenType.CLEAR, word))
+        elif word in ("to", "for"):
+            tokens.append(Token(TokenType.PREPOSITION, word))
+        elif word == "go" and following == "around":
+            i += 1
+            tokens.append(Token(TokenType.GO_AROUND, "go around"))
+        elif word == "line" and following == "up":
+            i += 1
+            tokens.append(Token(TokenType.LINE_UP, "line up"))
+        elif word == "good" and following in ("morning", "afternoon", "evening"):
+            i += 1
+            tokens.append(Token(TokenType.GREETING, "%s %s" % (word, following)))
+        elif word.isnumeric():
+            tokens.append(Token(TokenType.NUMBER, int(word)))
+        elif word.isalpha():
+            tokens.append(Token(TokenType.WORD, word))
+        else:
+            raise RuntimeError("Unknown token: %s" % word)
+        i += 1
+    return tokens
+
+
+def master_lexer(string: str) -> list[Token]:
+    tokens = []
+    for token in Lexer(string):
+        if token.token_type == TokenType.EOF:
+            break
+        tokens.append(token)
+    return tokens
+
+
+def lex_time(corpus: list[str], lexer) -> tuple[float, int]:
+    start = time.perf_counter()
+    tokens = sum(len(lexer(phrase)) for phrase in corpus)
+    return time.perf_counter() - start, tokens
+
+
+def check_spelled():
+    for phrase, expected in SPELLED_NUMBERS.items():
+        values = [token.value for token in Lexer(phrase).tokens]
+        if values != [expected]:
+            raise RuntimeError("'{}' lexes as {}, not {}".format(phrase, values, expected))
+    for phrase, (expected_callsign, expected_meta) in SPELLED_PHRASES.items():
+        callsign, _, meta = Parser(Lexer(phrase)).valid()
+        if (callsign, meta) != (expected_callsign, expected_meta):
+            raise RuntimeError("'{}' parses as {} {}, not {} {}".format(
+                phrase, callsign, meta, expected_callsign, expected_meta))
+
+
+def check_ties():
+    # equally similar aircraft are told apart by callsign, whatever the hash seed of the process
+    callsigns, heard, expected = TIED_CALLSIGNS
+    airport = Airport("Check", seed=0)
+    for callsign in callsigns:
+        airport.add_aircraft(AiAircraft(callsign, (0, 0), 0, 0, 0, Status.PARKED, airport))
+    found = airport.find_aircraft(heard)
+    if found is None or found.callsign != expected:
+        raise RuntimeError("'{}' finds {}, not {}".format(heard, found and found.callsign, expected))
+
+
+def main():
+    check_spelled()
+    check_ties()
+    corpus = make_corpus(random.Random(0))
+    for phrase in corpus[:1000]:
+        old = [(t.token_type, t.value) for t in word_lexer(phrase)]
+        new = [(t.token_type, t.value) for t in master_lexer(phrase)]
+        if old != new:
+            raise RuntimeError("Lexers disagree on '{}'".format(phrase))
+
+    print("{:>8} {:>10} {:>12} {:>14}".format("lexer", "s", "phrases/s", "tokens/s"))
+    for name, lexer in (("words", word_lexer), ("master", master_lexer)):
+        elapsed, tokens = lex_time(corpus, lexer)
+        print("{:>8} {:>10.3f} {:>12.0f} {:>14.0f}".format(name, elapsed, len(corpus) / elapsed, tokens / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# A* against the full Dijkstra expansion on large synthetic ground maps.
+# Run from the repository root: python -m benchmarks.pathfinding
+import random
+import time
+
+from ground_map import GroundMap, Waypoint
+
+SIZE = 100  # SIZE x SIZE grid, 10k nodes
+SPACING = 10  # px
+BLOCKED = 0.2  # share of removed edges
+QUERIES = 50
+
+
+def make_grid(size: int, rng: random.Random, blocked: float = BLOCKED) -> GroundMap:
+    ground_map = GroundMap()
+    for x in range(size):
+        for y in range(size):
+            ground_map.add_point(Waypoint("n{}_{}".format(x, y), x * SPACING, y * SPACING))
+    for x in range(size):
+        for y in range(size):
+            for nx, ny in ((x + 1, y), (x, y + 1)):
+                if nx < size and ny < size and rng.random() >= blocked:
+                    ground_map.add_edge("n{}_{}".format(x, y), "n{}_{}".format(nx, ny))
+                    ground_map.add_edge("n{}_{}".format(nx, ny), "n{}_{}".format(x, y))
+    return ground_map
+
+
+def dijkstra_path(ground_map: GroundMap, start: str, end: str) -> list[str] | None:
+    _, previous_points = ground_map.dijkstra(start)
+    if end not in previous_points:
+        return None
+    path = []
+    point = end
+    while point is not None:
+        path.append(point)
+        point = previous_points[point]
+    path.reverse()
+    return path
+
+
+def path_length(ground_map: GroundMap, path: list[str]) -> int:
+    return sum(ground_map.manhattan_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+def main():
+    rng = random.Random(0)
+    ground_map = make_grid(SIZE, rng)
+    names = ["n{}_{}".format(x, y) for x in range(SIZE) for y in range(SIZE)]
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(QUERIES - 1)]
+    # one target without any connection to check the unreachable case
+    ground_map.add_point(Waypoint("island", -SPACING, -SPACING))
+    pairs.append((names[0], "island"))
+
+    start = time.perf_counter()
+    expected = [dijkstra_path(ground_map, a, b) for a, b in pairs]
+    dijkstra_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [ground_map.a_star(a, b) for a, b in pairs]
+    a_star_time = time.perf_counter() - start
+
+    for (a, b), e, f in zip(pairs, expected, found):
+        if (e is None) != (f is None) or (e and path_length(ground_map, e) != path_length(ground_map, f)):
+            raise RuntimeError("A* and Dijkstra disagree on %s -> %s" % (a, b))
+
+    unreachable = sum(1 for e in expected if e is None)
+    print("{} nodes, {} queries ({} unreachable)".format(len(names), QUERIES, unreachable))
+    print("dijkstra {:8.2f} ms/query".format(dijkstra_time / QUERIES * 1000))
+    print("a*       {:8.2f} ms/query ({:.1f}x)".format(a_star_time / QUERIES * 1000, dijkstra_time / a_star_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+# The benchmark suite: times routing, command parsing, the tick update, loading the airline data and
+# airport queries on the real code, headless, writes the results to a JSON file and compares them with a
+# stored baseline.
+# Run from the repository root: python -m benchmarks.run [--save-baseline | --no-baseline] [--threshold PERCENT]
+# Exits with status 1 if a case is more than threshold percent slower than in the baseline, with status 2 if
+# there is no baseline. Baselines are specific to the machine and not committed, each machine stores its own.
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import airports
+import compiler.data as data
+from airport import Airport
+from benchmarks.fleet import make_airport
+from benchmarks.lexer import make_corpus
+from benchmarks.pathfinding import make_grid
+from compiler import airline_index
+from compiler.lexer import Lexer
+from compiler.parser import Parser, parse_phrase
+from fleet import np
+
+RESULTS = "benchmarks/results.json"
+BASELINE = "benchmarks/baseline.json"
+THRESHOLD = 20  # % a case may be slower than its baseline
+REPEATS = 5  # the fastest of these runs counts, the others absorb warm up and noise
+GRID_SIZES = (30, 100)
+ROUTE_QUERIES = 50
+PHRASES = 5000
+FLEET_SIZES = (10, 100, 1000, 10000)
+UPDATE_TICKS = 10
+AIRPORT_QUERIES = 100
+
+# name -> setup of a case, the setup returns the function to time and the number of operations it runs
+CASES: dict[str, Callable[[], tuple[Callable[[], None], int]]] = {}
+# what the setup of the case being measured opened or created, closed and removed once it is measured
+cleanups: list[Callable[[], None]] = []
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def temporary_path(name: str) -> str:
+    # a path in a directory that is removed after the case
+    directory = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+    cleanups.append(directory.cleanup)
+    return os.path.join(directory.name, name)
+
+
+def reset_airlines():
+    # the next lookup loads the airlines again, an index that is dropped is closed first
+    if isinstance(data.airlines, airline_index.AirlineIndex):
+        data.airlines.close()
+    data.airlines = None
+    data.spoken_airlines = None
+
+
+def route_pairs(ground_map, names: list[str], count: int, rng: random.Random) -> list[tuple[str, str]]:
+    # pairs with a route between them, a_star does not fill the route caches the cases time
+    pairs = []
+    while len(pairs) < count:
+        start, end = rng.choice(names), rng.choice(names)
+        if ground_map.a_star(start, end) is not None:
+            pairs.append((start, end))
+    return pairs
+
+
+def dijkstra_case(ground_map, starts: list[str]):
+    def run():
+        for start in starts:
+            ground_map.dijkstra(start)
+    return run, len(starts)
+
+
+def path_case(ground_map, pairs: list[tuple[str, str]], cached: bool):
+    def run():
+        if not cached:
+            ground_map.invalidate_routes()
+        for start, end in pairs:
+            ground_map.get_shortest_path(start, end)
+    return run, len(pairs)
+
+
+def stock_map():
+    ground_map = Airport("Benchmark").ground_map
+    names = list(ground_map._points)
+    return ground_map, names, route_pairs(ground_map, names, ROUTE_QUERIES, random.Random(0))
+
+
+@case("route/stock/dijkstra")
+def stock_dijkstra():
+    ground_map, names, _ = stock_map()
+    return dijkstra_case(ground_map, names)
+
+
+@case("route/stock/path")
+def stock_path():
+    ground_map, _, pairs = stock_map()
+    return path_case(ground_map, pairs, False)
+
+
+@case("route/stock/path cached")
+def stock_path_cached():
+    ground_map, _, pairs = stock_map()
+    return path_case(ground_map, pairs, True)
+
+
+def grid_map(size: int):
+    rng = random.Random(0)
+    ground_map = make_grid(size, rng)
+    names = ["n{}_{}".format(x, y) for x in range(size) for y in range(size)]
+    return ground_map, names, route_pairs(ground_map, names, ROUTE_QUERIES, rng)
+
+
+for grid_size in GRID_SIZES:
+    def grid_dijkstra(size=grid_size):
+        ground_map, names, _ = grid_map(size)
+        return dijkstra_case(ground_map, names[:10])
+
+    def grid_path(size=grid_size):
+        ground_map, _, pairs = grid_map(size)
+        return path_case(ground_map, pairs, False)
+    case("route/grid {0}x{0}/dijkstra".format(grid_size))(grid_dijkstra)
+    case("route/grid {0}x{0}/path".format(grid_size))(grid_path)
+
+
+@case("parse/lexer")
+def lexer():
+    corpus = make_corpus(random.Random(0))[:PHRASES]
+
+    def run():
+        for phrase in corpus:
+            Lexer(phrase)
+    return run, len(corpus)
+
+
+@case("parse/lexer and parser")
+def parser():
+    corpus = make_corpus(random.Random(0))[:PHRASES]
+
+    def run():
+        parse_phrase.cache_clear()
+        for phrase in corpus:
+            Parser(Lexer(phrase)).valid()
+    return run, len(corpus)
+
+
+@case("parse/lexer and parser cached")
+def parser_cached():
+    # the phrases a controller repeats, every one is in the parse cache after the first run
+    corpus = make_corpus(random.Random(0))[:100] * (PHRASES // 100)
+
+    def run():
+        for phrase in corpus:
+            Parser(Lexer(phrase)).valid()
+    return run, len(corpus)
+
+
+for fleet_size in FLEET_SIZES:
+    def update(count=fleet_size):
+        airport = make_airport(count, np is not None)
+
+        def run():
+            for _ in range(UPDATE_TICKS):
+                airport.update(0.1)
+        return run, UPDATE_TICKS
+    case("update/{} aircraft".format(fleet_size))(update)
+
+
+@case("airlines/cold start")
+def airlines_cold():
+    # what the first callsign lookup of the game costs, with the compiled index if there is one
+    def run():
+        reset_airlines()
+        data.get_airline_from_callsign("lufthansa")
+        data.get_random_callsign(random.Random(0))
+    return run, 1
+
+
+@case("airlines/cold start csv")
+def airlines_csv():
+    def run():
+        data.AirlineTable(data.read_airlines()).lookup("callsign", "lufthansa")
+    return run, 1
+
+
+@case("airlines/cold start index")
+def airlines_index():
+    path = temporary_path("airlines.idx")
+    airline_index.build(path=path)
+
+    def run():
+        index = airline_index.open_index(path=path)
+        index.lookup("callsign", "lufthansa")
+        index.close()
+    return run, 1
+
+
+def airport_index() -> str:
+    path = temporary_path("airports.idx")
+    airports.build(path=path)
+    return path
+
+
+def airport_queries(query):
+    index = airports.AirportIndex(airport_index())
+    cleanups.append(index.close)
+    rng = random.Random(0)
+    positions = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(AIRPORT_QUERIES)]
+
+    def run():
+        for latitude, longitude in positions:
+            query(index, latitude, longitude)
+    return run, len(positions)
+
+
+@case("airports/open and lookup")
+def airports_lookup():
+    path = airport_index()
+
+    def run():
+        index = airports.AirportIndex(path)
+        index.find("KDEN")
+        index.close()
+    return run, 1
+
+
+@case("airports/within 300 nm")
+def airports_within():
+    return airport_queries(lambda index, latitude, longitude: index.within(latitude, longitude, 300))
+
+
+@case("airports/nearest 5")
+def airports_nearest():
+    return airport_queries(lambda index, latitude, longitude: index.nearest(latitude, longitude, 5))
+
+
+def measure(setup) -> float:
+    # s per operation of the fastest run
+    try:
+        run, operations = setup()
+        best = None
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            run()
+            elapsed = (time.perf_counter() - start) / operations
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    finally:
+        # the index is closed before its directory is removed
+        while cleanups:
+            cleanups.pop()()
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return "{:.2f} ms".format(seconds * 1e3)
+    return "{:.2f} us".format(seconds * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with the baseline.")
+    parser.add_argument("cases", nargs="*", help="only run the cases whose name starts with one of these")
+    parser.add_argument("--output", default=RESULTS, help="where the results are written")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="%% a case may be slower than in the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--no-baseline", action="store_true", help="only measure, do not compare")
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save_baseline and not args.no_baseline:
+        # without a baseline nothing could be reported as slower, so that is an error and not a pass
+        if not os.path.exists(args.baseline):
+            print("No baseline at {}, store one with --save-baseline or run with --no-baseline".format(
+                args.baseline))
+            sys.exit(2)
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    regressions = []
+    print("{:<36} {:>12} {:>12} {:>8}".format("case", "per op", "baseline", "change"))
+    for name, setup in CASES.items():
+        if args.cases and not any(name.startswith(prefix) for prefix in args.cases):
+            continue
+        results[name] = measure(setup)
+        if name not in baseline:
+            print("{:<36} {:>12}".format(name, format_time(results[name])))
+            continue
+        change = (results[name] / baseline[name] - 1) * 100
+        print("{:<36} {:>12} {:>12} {:>+7.1f}%".format(
+            name, format_time(results[name]), format_time(baseline[name]), change))
+        if change > args.threshold:
+            regressions.append(name)
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "numpy": np is not None,
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "unit": "s per operation", "results": results}
+    for path in (args.output, args.baseline) if args.save_baseline else (args.output,):
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+    print("Results written to", args.baseline if args.save_baseline else args.output)
+
+    if regressions:
+        print("{} slower than the baseline by more than {}%: {}".format(
+            len(regressions), args.threshold, ", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import collections
+import time
+from typing import Callable
+
+LATENCY_SAMPLES = 1000  # most recent applied commands the latency statistics are taken from
+
+
+class Command:
+    def __init__(self, callsign: str, instruction, meta, source: str = "", issued: float | None = None):
+        self.callsign = callsign
+        # the callsign as it was given, callsign becomes the one it was matched to
+        self.heard = callsign
+        self.instruction = instruction
+        self.meta = meta
+        self.source = source
+        # perf_counter of when the command was given, latencies are measured from here. Voice commands are
+        # given when the speaker stops talking, everything else when it is submitted.
+        self.enqueued = time.perf_counter() if issued is None else issued
+
+    def key(self):
+        return self.callsign, self.instruction, str(self.meta)
+
+    def __str__(self):
+        if self.heard != self.callsign:
+            return "{} (heard {}) {} {}".format(self.callsign, self.heard, self.instruction.name, self.meta)
+        return "{} {} {}".format(self.callsign, self.instruction.name, self.meta)
+
+
+# Outcome of a command. reason says why a rejected command was not applied.
+class Feedback:
+    def __init__(self, command: Command, accepted: bool, reason: str = "", latency: float = 0.0):
+        self.command = command
+        self.accepted = accepted
+        self.reason = reason
+        self.latency = latency
+
+    def __str__(self):
+        if self.accepted:
+            return "{}: applied after {:.1f} ms".format(self.command, self.latency * 1000)
+        return "{}: rejected, {}".format(self.command, self.reason)
+
+
+# Instructions from all producers (voice, text console, input box, auto controller) go through one bus.
+# submit() may be called from any thread, the simulation drains everything pending once per tick on the
+# main loop. Identical commands that arrive in the same batch are applied once.
+class CommandBus:
+    def __init__(self):
+        self._pending: collections.deque[Command] = collections.deque()
+        self._listeners: list[Callable[[Feedback], None]] = []
+        self.latencies: collections.deque[float] = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.applied = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        # commands waiting for the next tick
+        return len(self._pending)
+
+    def add_listener(self, listener: Callable[[Feedback], None]):
+        self._listeners.append(listener)
+
+    def submit(self, callsign: str, instruction, meta, source: str = "", issued: float | None = None) -> Command:
+        command = Command(callsign, instruction, meta, source, issued)
+        self._pending.append(command)
+        self.max_depth = max(self.max_depth, len(self._pending))
+        return command
+
+    def drain(self, airport) -> list[Feedback]:
+        # only the commands pending now, anything submitted meanwhile waits for the next batch
+        batch = [self._pending.popleft() for _ in range(len(self._pending))]
+        results = []
+        seen = set()
+        for command in batch:
+            if command.key() in seen:
+                results.append(self._reject(command, "duplicate in the same tick"))
+                continue
+            seen.add(command.key())
+            results.append(self._apply(airport, command))
+        for feedback in results:
+            for listener in self._listeners:
+                listener(feedback)
+        return results
+
+    def _apply(self, airport, command: Command) -> Feedback:
+        aircraft = airport.find_aircraft(command.callsign)
+        if aircraft is None:
+            return self._reject(command, "unknown callsign")
+        command.callsign = aircraft.callsign
+        status = aircraft.get_status()
+        try:
+            accepted = aircraft.set_instruction(command.instruction, command.meta)
+        except RuntimeError as e:
+            return self._reject(command, str(e))
+        if not accepted:
+            return self._reject(command, "not possible while {}".format(status.name))
+        latency = time.perf_counter() - command.enqueued
+        self.latencies.append(latency)
+        self.applied += 1
+        return Feedback(command, True, latency=latency)
+
+    def _reject(self, command: Command, reason: str) -> Feedback:
+        self.rejected += 1
+        return Feedback(command, False, reason)
+
+    def latency_percentile(self, percentile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def __str__(self):
+        return "{} applied, {} rejected, depth {} (max {}), latency p50 {:.1f} ms p95 {:.1f} ms".format(
+            self.applied, self.rejected, len(self), self.max_depth,
+            self.latency_percentile(50) * 1000, self.latency_percentile(95) * 1000)
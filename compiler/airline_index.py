@@ -0,0 +1,152 @@
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+from compiler.data import AIRLINES_CSV, Airline, key_tables, normalize_key, read_airlines, spoken_positions
+from compiler.lexer import WORD_TYPES
+
+AIRLINE_INDEX = "resources/airlines.idx"
+MAGIC = b"ATCA"
+VERSION = 2
+FIELDS = ("callsign", "iata", "icao")
+SEPARATOR = "\x1f"
+
+# magic, version, SHA-1 of the CSV and the keywords the index was built from, number of records, number of
+# spoken airlines, number of keys per field
+HEADER = struct.Struct("<4sH20sII" + "I" * len(FIELDS))
+# offset and length of a record in the string section
+RECORD = struct.Struct("<IH")
+# offset and length of a key in the string section, record the key belongs to
+KEY = struct.Struct("<IBH")
+# record of an airline callsigns are made for, see compiler.data.spoken_positions
+SPOKEN = struct.Struct("<H")
+
+
+# Compiled airline data, memory mapped. The file holds a record table, one key table per field sorted by
+# key, the records of the airlines callsigns are made for, and the strings the tables point into. Lookups
+# binary search the key table in place, so opening the index reads nothing but the header, and only the
+# records that are looked up are decoded.
+class AirlineIndex:
+    def __init__(self, path: str = AIRLINE_INDEX):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.digest, self.count, self._spoken_count, *key_counts = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("{} is not an airline index of version {}".format(path, VERSION))
+        self._records_offset = HEADER.size
+        self._tables: dict[str, tuple[int, int]] = {}
+        offset = self._records_offset + self.count * RECORD.size
+        for field, count in zip(FIELDS, key_counts):
+            self._tables[field] = (offset, count)
+            offset += count * KEY.size
+        self._spoken_offset = offset
+        self._strings_offset = offset + self._spoken_count * SPOKEN.size
+        self._airlines: dict[int, Airline] = {}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (self.record(i) for i in range(self.count))
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_offset + offset
+        return self._map[start:start + length]
+
+    def record(self, i: int) -> Airline:
+        # decoded once, so every lookup of an airline returns the same object
+        airline = self._airlines.get(i)
+        if airline is None:
+            offset, length = RECORD.unpack_from(self._map, self._records_offset + i * RECORD.size)
+            name, iata, icao, callsign, country, active = self._string(offset, length).decode().split(SEPARATOR)
+            airline = self._airlines[i] = Airline(name, iata, icao, callsign, country, active == "Y")
+        return airline
+
+    def spoken(self) -> list[Airline]:
+        return [self.record(i) for i, in SPOKEN.iter_unpack(
+            self._map[self._spoken_offset:self._spoken_offset + self._spoken_count * SPOKEN.size])]
+
+    def lookup(self, field: str, key: str) -> Airline | None:
+        wanted = normalize_key(key).encode()
+        table, count = self._tables[field]
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, record = KEY.unpack_from(self._map, table + middle * KEY.size)
+            found = self._string(offset, length)
+            if found == wanted:
+                return self.record(record)
+            if found < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+def csv_digest(path: str = AIRLINES_CSV) -> bytes:
+    # the keywords decide which airlines callsigns are made for, a new one makes the index out of date too
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read() + " ".join(sorted(WORD_TYPES)).encode()).digest()
+
+
+def build(csv_path: str = AIRLINES_CSV, path: str = AIRLINE_INDEX) -> int:
+    airlines = read_airlines(csv_path)
+    tables = key_tables(airlines)
+    strings = bytearray()
+
+    def add_string(value: str) -> tuple[int, int]:
+        data = value.encode()
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    records = bytearray()
+    for airline in airlines:
+        fields = (airline.name, airline.iata, airline.icao, airline.callsign, airline.country)
+        value = SEPARATOR.join(field or "" for field in fields) + SEPARATOR + ("Y" if airline.active else "N")
+        records.extend(RECORD.pack(*add_string(value)))
+
+    keys = bytearray()
+    for field in FIELDS:
+        for key, i in sorted(tables[field].items(), key=lambda item: item[0].encode()):
+            keys.extend(KEY.pack(*add_string(key), i))
+
+    spoken = spoken_positions(airlines, tables)
+    header = HEADER.pack(MAGIC, VERSION, csv_digest(csv_path), len(airlines), len(spoken),
+                         *(len(tables[field]) for field in FIELDS))
+    # written next to the index and renamed, so a reader never sees half a file
+    with open(path + ".tmp", "wb") as file:
+        file.write(header + records + keys + b"".join(SPOKEN.pack(i) for i in spoken) + strings)
+    os.replace(path + ".tmp", path)
+    return len(airlines)
+
+
+def open_index(csv_path: str = AIRLINES_CSV, path: str = AIRLINE_INDEX) -> AirlineIndex | None:
+    # the index if it exists and was built from the current CSV, None otherwise
+    if not os.path.exists(path):
+        return None
+    try:
+        index = AirlineIndex(path)
+    except (RuntimeError, struct.error, ValueError) as e:
+        print("Ignoring airline index:", e)
+        return None
+    if index.digest != csv_digest(csv_path):
+        print("Airline index {} is out of date, rebuild it with python -m compiler.airline_index".format(path))
+        index.close()
+        return None
+    return index
+
+
+def main():
+    start = time.perf_counter()
+    count = build()
+    print("Compiled {} airlines into {} ({} bytes) in {:.0f} ms".format(
+        count, AIRLINE_INDEX, os.path.getsize(AIRLINE_INDEX), (time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
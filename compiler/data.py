@@ -1,50 +1,139 @@
 import csv
 import random
 
+from compiler.lexer import WORD_TYPES
+
+AIRLINES_CSV = "resources/airlines.csv"
+PLACEHOLDERS = ("", "-", "N/A", "\\N")
+
 
 class Airline:
+    __slots__ = ("name", "iata", "icao", "callsign", "country", "active")
+
     def __init__(self, name: str, iata: str, icao: str, callsign: str, country: str, active: bool):
-        self.name: str = name if name != "" else None
-        self.iata: str = iata if name != "" else None
-        self.icao: str = icao if name != "" else None
-        self.callsign: str = callsign if name != "" else None
-        self.country: str = country if name != "" else None
+        # placeholders of the data set are stored as None
+        self.name: str | None = name if name not in PLACEHOLDERS else None
+        self.iata: str | None = iata if iata not in PLACEHOLDERS else None
+        self.icao: str | None = icao if icao not in PLACEHOLDERS else None
+        self.callsign: str | None = callsign if callsign not in PLACEHOLDERS else None
+        self.country: str | None = country if country not in PLACEHOLDERS else None
         self.active: bool = active
 
 
-airlines: list[Airline] = []
-index: dict[str, int] = {}
+def normalize_key(key: str) -> str:
+    # "Air Canada", "AIRCANADA" and "air canada" are the same key, the parser joins spoken words
+    return "".join(key.split()).lower()
 
 
-def load_airlines():
-    global airlines
-    if len(airlines) != 0:
-        return
-    with open("resources/airlines.csv", newline='') as csvfile:
+def read_airlines(path: str = AIRLINES_CSV) -> list[Airline]:
+    airlines = []
+    with open(path, newline='') as csvfile:
         rows = csv.reader(csvfile, delimiter=',')
+        next(rows, None)  # header
         for row in rows:
             airlines.append(Airline(row[0], row[1], row[2], row[3], row[4], True if row[5] == "Y" else False))
+    return airlines
+
+
+def key_tables(airlines: list[Airline]) -> dict[str, dict[str, int]]:
+    # key -> position in airlines for every field an airline can be looked up by. Where airlines share a
+    # key the first active one wins, otherwise the first one.
+    tables: dict[str, dict[str, int]] = {"callsign": {}, "iata": {}, "icao": {}}
+    for i, airline in enumerate(airlines):
+        for field, table in tables.items():
+            value = getattr(airline, field)
+            if value is None:
+                continue
+            key = normalize_key(value)
+            if key not in table or (airline.active and not airlines[table[key]].active):
+                table[key] = i
+    return tables
+
+
+def code_field(code: str) -> str:
+    return "iata" if len(code) == 2 else "icao"
+
+
+def spoken_positions(airlines: list[Airline], tables: dict[str, dict[str, int]]) -> list[int]:
+    # positions of the active airlines whose telephony callsign is a single word, not a keyword, and whose
+    # callsign and code both lead back to the airline, so a spoken "<callsign> <number>" always reaches the
+    # aircraft the callsign was made for
+    positions = []
+    for i, airline in enumerate(airlines):
+        code = airline_code(airline) or ""
+        if (airline.active and airline.callsign and airline.callsign.isalpha()
+                and airline.callsign.lower() not in WORD_TYPES and code.isalnum()
+                and tables["callsign"].get(normalize_key(airline.callsign)) == i
+                and tables[code_field(code)].get(normalize_key(code)) == i):
+            positions.append(i)
+    return positions
+
+
+# The airlines read from the CSV, used when there is no up to date compiled index.
+class AirlineTable:
+    def __init__(self, airlines: list[Airline]):
+        self.airlines = airlines
+        self.tables = key_tables(airlines)
+
+    def __iter__(self):
+        return iter(self.airlines)
+
+    def spoken(self) -> list[Airline]:
+        return [self.airlines[i] for i in spoken_positions(self.airlines, self.tables)]
 
+    def lookup(self, field: str, key: str) -> Airline | None:
+        i = self.tables[field].get(normalize_key(key))
+        return None if i is None else self.airlines[i]
 
-def index_airlines():
-    global index
+
+airlines = None
+spoken_airlines: list[Airline] | None = None
+
+
+def load_airlines():
+    # the compiled index if it matches the CSV, see compiler.airline_index, the CSV otherwise
     global airlines
-    if len(index) != 0:
-        return
-    index = {airline.callsign.lower(): i for i, airline in enumerate(airlines)}
+    if airlines is not None:
+        return airlines
+    from compiler import airline_index
+    airlines = airline_index.open_index()
+    if airlines is None:
+        airlines = AirlineTable(read_airlines())
+    return airlines
 
 
 def get_airline_from_callsign(callsign: str) -> Airline | None:
-    load_airlines()
-    index_airlines()
-    i = index.get(callsign.lower())
-    if i is None:
-        return None
-    return airlines[i]
-
-def get_random_callsign() -> str:
-    # load_airlines()
-    # index_airlines()
-    # airline = airlines[index[random.choice(list(index))]]
-    # return (airline.iata if len(airline.iata) != 0 else airline.icao) + str(random.randint(1, 9999))
-    return "LH"+str(random.randrange(1,999))
\ No newline at end of file
+    return load_airlines().lookup("callsign", callsign)
+
+
+def get_airline_from_code(code: str) -> Airline | None:
+    return load_airlines().lookup(code_field(code), code)
+
+
+def airline_code(airline: Airline) -> str | None:
+    # code a flight of the airline is written with, the same the parser turns the spoken callsign into
+    return airline.iata or airline.icao
+
+
+def split_callsign(callsign: str) -> tuple[Airline | None, int | None]:
+    # airline and flight number of a callsign like "LH4713" or "DLH4713"
+    for length in (2, 3):
+        code, number = callsign[:length], callsign[length:]
+        if number.isdigit():
+            airline = get_airline_from_code(code)
+            if airline is not None:
+                return airline, int(number)
+    return None, None
+
+
+def callsign_airlines() -> list[Airline]:
+    # the airlines callsigns are made for, see spoken_positions, the compiled index stores them ready made
+    global spoken_airlines
+    if spoken_airlines is None:
+        spoken_airlines = load_airlines().spoken()
+    return spoken_airlines
+
+
+def get_random_callsign(rng: random.Random = random) -> str:
+    airline = rng.choice(callsign_airlines())
+    return airline_code(airline) + str(rng.randint(1, 9999))
@@ -0,0 +1,68 @@
+from typing import Hashable
+
+MIN_SIMILARITY = 0.5
+
+
+def trigrams(text: str) -> set[str]:
+    # padded like "  lufthansa ", so short words and the start of a word still have trigrams
+    text = "  " + "".join(text.lower().split()) + " "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    # Dice coefficient of two trigram sets
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+# Approximate string lookup: every key is split into trigrams and a posting set per trigram lists the
+# keys that contain it. A search only scores keys that share a trigram with the text, so its cost
+# depends on the number of similar keys and not on the size of the index.
+class TrigramIndex:
+    def __init__(self):
+        self._postings: dict[str, set[str]] = {}
+        self._trigrams: dict[str, set[str]] = {}
+        self._values: dict[str, set[Hashable]] = {}
+        self._keys: dict[Hashable, set[str]] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key: str, value: Hashable):
+        key = "".join(key.lower().split())
+        if key not in self._trigrams:
+            self._trigrams[key] = trigrams(key)
+            for trigram in self._trigrams[key]:
+                self._postings.setdefault(trigram, set()).add(key)
+        self._values.setdefault(key, set()).add(value)
+        self._keys.setdefault(value, set()).add(key)
+
+    def remove(self, value: Hashable):
+        for key in self._keys.pop(value, ()):
+            values = self._values[key]
+            values.discard(value)
+            if values:
+                continue
+            del self._values[key]
+            for trigram in self._trigrams.pop(key):
+                postings = self._postings[trigram]
+                postings.discard(key)
+                if not postings:
+                    del self._postings[trigram]
+
+    def search(self, text: str, min_similarity: float = MIN_SIMILARITY) -> list[tuple[float, Hashable]]:
+        # values with a key at least min_similarity similar to text, the most similar first and equally
+        # similar ones in order of value, so ties do not depend on the hash seed of the process
+        wanted = trigrams(text)
+        candidates = set()
+        for trigram in wanted:
+            candidates |= self._postings.get(trigram, set())
+        scores: dict[Hashable, float] = {}
+        for key in candidates:
+            score = similarity(wanted, self._trigrams[key])
+            if score < min_similarity:
+                continue
+            for value in self._values[key]:
+                scores[value] = max(score, scores.get(value, 0.0))
+        return sorted(((score, value) for value, score in scores.items()), key=lambda item: (-item[0], item[1]))
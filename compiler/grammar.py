@@ -0,0 +1,160 @@
+import os
+import re
+
+from compiler.lexer import Token, TokenType
+
+SPEC_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "grammer")
+SPEC_SECTION = "Parser Regeln (LL(1)):"
+RULE_PATTERN = re.compile(r"^([a-z_]+)\s*:(.*?);", re.MULTILINE | re.DOTALL)
+END = TokenType.EOF.name
+
+
+# Parse tree node, children are Nodes for rules and Tokens for terminals
+class Node:
+    __slots__ = ("rule", "children")
+
+    def __init__(self, rule: str):
+        self.rule = rule
+        self.children: list = []
+
+
+# LL(1) grammar over the token types of the lexer. The parse table maps (rule, token type) to the
+# alternative to expand, so parsing is one table lookup per rule and one comparison per token.
+class Grammar:
+    def __init__(self, rules: dict[str, list[list[str]]], start: str):
+        self.rules = rules
+        self.start = start
+        for alternatives in rules.values():
+            for alternative in alternatives:
+                for symbol in alternative:
+                    if not self.is_terminal(symbol) and symbol not in rules:
+                        raise RuntimeError("Grammar uses undefined rule %s" % symbol)
+                    if self.is_terminal(symbol) and symbol not in TokenType.__members__:
+                        raise RuntimeError("Grammar uses unknown token %s" % symbol)
+        self.first = self._first_sets()
+        self.follow = self._follow_sets()
+        self.table = self._parse_table()
+
+    @classmethod
+    def from_spec(cls, text: str) -> "Grammar":
+        # reads the rules after SPEC_SECTION up to the next blank line followed by a section title
+        start = text.index(SPEC_SECTION) + len(SPEC_SECTION)
+        end = text.find("\n\n\n", start)
+        rules: dict[str, list[list[str]]] = {}
+        first_rule = None
+        for name, body in RULE_PATTERN.findall(text[start:end if end != -1 else len(text)]):
+            if name in rules:
+                raise RuntimeError("Rule %s is defined twice" % name)
+            rules[name] = [alternative.split() for alternative in body.split("|")]
+            first_rule = first_rule or name
+        if first_rule is None:
+            raise RuntimeError("No rules in grammar spec")
+        return cls(rules, first_rule)
+
+    @classmethod
+    def load(cls, path: str = SPEC_PATH) -> "Grammar":
+        with open(path) as spec:
+            return cls.from_spec(spec.read())
+
+    @staticmethod
+    def is_terminal(symbol: str) -> bool:
+        return symbol.isupper()
+
+    def _first_of(self, symbols: list[str], first: dict[str, set[str]]) -> tuple[set[str], bool]:
+        # FIRST set of a sequence of symbols and whether the whole sequence can be empty
+        result = set()
+        for symbol in symbols:
+            if self.is_terminal(symbol):
+                result.add(symbol)
+                return result, False
+            result |= first[symbol] - {""}
+            if "" not in first[symbol]:
+                return result, False
+        return result, True
+
+    def _first_sets(self) -> dict[str, set[str]]:
+        first: dict[str, set[str]] = {name: set() for name in self.rules}
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.rules.items():
+                for alternative in alternatives:
+                    symbols, empty = self._first_of(alternative, first)
+                    if empty:
+                        symbols.add("")
+                    if not symbols <= first[name]:
+                        first[name] |= symbols
+                        changed = True
+        return first
+
+    def _follow_sets(self) -> dict[str, set[str]]:
+        follow: dict[str, set[str]] = {name: set() for name in self.rules}
+        follow[self.start].add(END)
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.rules.items():
+                for alternative in alternatives:
+                    for i, symbol in enumerate(alternative):
+                        if self.is_terminal(symbol):
+                            continue
+                        symbols, empty = self._first_of(alternative[i + 1:], self.first)
+                        if empty:
+                            symbols |= follow[name]
+                        if not symbols <= follow[symbol]:
+                            follow[symbol] |= symbols
+                            changed = True
+        return follow
+
+    def _parse_table(self) -> dict[tuple[str, str], list[str]]:
+        table: dict[tuple[str, str], list[str]] = {}
+        for name, alternatives in self.rules.items():
+            for alternative in alternatives:
+                symbols, empty = self._first_of(alternative, self.first)
+                if empty:
+                    symbols |= self.follow[name]
+                for terminal in symbols:
+                    if (name, terminal) in table:
+                        raise RuntimeError("Grammar is not LL(1): %s has two alternatives for %s" % (name, terminal))
+                    table[(name, terminal)] = alternative
+        return table
+
+    def parse(self, tokens: list[Token]) -> Node:
+        tokens = tokens + [Token(TokenType.EOF, None)]
+        root = Node(self.start)
+        # symbols still to match, the last one first, with the node their match becomes a child of
+        stack: list[tuple[str, Node | None]] = [(END, None)]
+        self._expand(stack, root, tokens[0])
+        position = 0
+        while stack:
+            token = tokens[position]
+            symbol, parent = stack.pop()
+            if self.is_terminal(symbol):
+                if token.token_type.name != symbol:
+                    raise RuntimeError("Parsing exception. Expected %s but was %s" % (symbol, token))
+                if parent is not None:
+                    parent.children.append(token)
+                position += 1
+            else:
+                node = Node(symbol)
+                parent.children.append(node)
+                self._expand(stack, node, token)
+        return root
+
+    def _expand(self, stack: list[tuple[str, Node | None]], node: Node, token: Token):
+        alternative = self.table.get((node.rule, token.token_type.name))
+        if alternative is None:
+            raise RuntimeError("Parsing exception. Unexpected %s in %s" % (token, node.rule))
+        for symbol in reversed(alternative):
+            stack.append((symbol, node))
+
+
+def main():
+    # checks the spec and prints the parse table
+    grammar = Grammar.load()
+    for (rule, terminal), alternative in sorted(grammar.table.items()):
+        print("%-16s %-12s -> %s" % (rule, terminal, " ".join(alternative) or "(empty)"))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,102 +1,128 @@
+import re
 from enum import Enum
 
 
-class Iterator:
-    def __init__(self, data_list: list):
-        self.data_list = data_list
-        self.index = 0
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if self.index >= len(self.data_list):
-            raise StopIteration
-        self.current = self.data_list[self.index]
-        self.index += 1
-        return self.current
-
-    def peek(self):
-        if self.index >= len(self.data_list):
-            return None
-        else:
-            return self.data_list[self.index]
-
-
 class TokenType(Enum):
-    (EOF, ABORT, CALLSIGN, CLEAR, CONTINUE, CROSS, FLIGHT, GATE, GO_AROUND, GREETING, HEADING, HEIGHT, HOLD, LAND,
-     LINE_UP, NEWLINE, NUMBER, POS, PREPOSITION, PUSHBACK, RUNWAY, SHORT, SPEED, TAXI, TAXIWAY, TAKEOFF, VIA, WAIT,
-     WIND, WORD, WS) = range(31)
+    (EOF, ABORT, AND, CALLSIGN, CLEAR, CLIMB, CONTINUE, CROSS, FEET, FLIGHT, GATE, GO_AROUND, GREETING, HEADING, HEAVY,
+     HEIGHT, HOLD, KNOTS, LAND, LEVEL, LINE_UP, NEWLINE, NUMBER, POS, PREPOSITION, PUSHBACK, RUNWAY, SHORT, SIDE, SPEED,
+     TAXI, TAXIWAY, TAKEOFF, TURN, VIA, WAIT, WIND, WORD, WS) = range(39)
 
 
 class Token:
+    __slots__ = ("token_type", "value")
+
     def __init__(self, token_type: TokenType, value):
         self.token_type = token_type
         self.value = value
 
+    def __eq__(self, other):
+        return isinstance(other, Token) and self.token_type == other.token_type and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.token_type, self.value))
+
     def __str__(self):
         return "<'%s', '%s'>" % (self.value, self.token_type.name)
 
 
 KEYWORDS = {
     "abort": TokenType.ABORT,
+    "and": TokenType.AND,
+    "center": TokenType.SIDE,
+    "centre": TokenType.SIDE,
     "clear": TokenType.CLEAR,
+    "climb": TokenType.CLIMB,
     "continue": TokenType.CONTINUE,
     "cross": TokenType.CROSS,
+    "descend": TokenType.CLIMB,
+    "feet": TokenType.FEET,
     "flight": TokenType.FLIGHT,
     "gate": TokenType.GATE,
+    "heading": TokenType.HEADING,
+    "heavy": TokenType.HEAVY,
     "hold": TokenType.HOLD,
+    "knots": TokenType.KNOTS,
     "land": TokenType.LAND,
+    "left": TokenType.SIDE,
+    "level": TokenType.LEVEL,
     "position": TokenType.POS,
     "pushback": TokenType.PUSHBACK,
+    "right": TokenType.SIDE,
     "runway": TokenType.RUNWAY,
     "short": TokenType.SHORT,
+    "speed": TokenType.SPEED,
     "takeoff": TokenType.TAKEOFF,
     "taxi": TokenType.TAXI,
+    "turn": TokenType.TURN,
     "via": TokenType.VIA,
     "wait": TokenType.WAIT,
+    "wind": TokenType.WIND,
     "word": TokenType.WORD
 }
 
 
+# single words that are not plain WORD tokens, see KEYWORDS
+WORD_TYPES = dict(KEYWORDS, cleared=TokenType.CLEAR, to=TokenType.PREPOSITION, **{"for": TokenType.PREPOSITION})
+# multi-word tokens by their first word
+PHRASE_TYPES = {"go": TokenType.GO_AROUND, "line": TokenType.LINE_UP, "good": TokenType.GREETING}
+
+# numbers as recognized speech spells them, "four seven one three" or "three thousand five hundred"
+SPELLED_DIGITS = {"zero": 0, "one": 1, "two": 2, "three": 3, "tree": 3, "four": 4, "five": 5, "fife": 5, "six": 6,
+                  "seven": 7, "eight": 8, "nine": 9, "niner": 9}
+SPELLED_MULTIPLIERS = {"hundred": 100, "thousand": 1000}
+
+# One pattern for the whole string, its matches are the tokens: a multi-word token, a word, a number or
+# a character that cannot start any token. Letters and digits are separate matches, so "lh123" lexes as
+# WORD NUMBER without a pre-pass. Whitespace and punctuation of recognized speech are skipped.
+MASTER_PATTERN = re.compile(
+    r"(?:go\s+around|line\s+up|good\s+(?:morning|afternoon|evening))(?![^\W\d_])"
+    r"|[^\W\d_]+|\d+|[^\w\s,;:!?.]|\.\d|\w")
+
+
+# Splits the whole string in one pass over the master pattern and classifies the matches by table.
 class Lexer:
 
     def __init__(self, string: str):
         self.string = string.lower().strip()
-        self.iterator = Iterator(self.string.split())
+        self.tokens: list[Token] = []
+        # thousands, hundreds and the digits since of a spelled number still being read, added up at its end
+        spelled: list[int] | None = None
+        for text in MASTER_PATTERN.findall(self.string):
+            if text in SPELLED_DIGITS:
+                spelled = spelled or [0, 0, 0]
+                spelled[2] = spelled[2] * 10 + SPELLED_DIGITS[text]
+                continue
+            if spelled is not None and text in SPELLED_MULTIPLIERS:
+                if SPELLED_MULTIPLIERS[text] == 1000:
+                    spelled = [spelled[0] + (spelled[1] + spelled[2]) * 1000, 0, 0]
+                else:
+                    spelled = [spelled[0], spelled[1] + spelled[2] * 100, 0]
+                continue
+            if spelled is not None:
+                self.tokens.append(Token(TokenType.NUMBER, sum(spelled)))
+                spelled = None
+            token_type = WORD_TYPES.get(text)
+            if token_type is not None:
+                self.tokens.append(Token(token_type, text))
+            elif text.isalpha():
+                self.tokens.append(Token(TokenType.WORD, text))
+            elif text.isdigit():
+                self.tokens.append(Token(TokenType.NUMBER, int(text)))
+            elif len(text) > 1 and text[-1].isalpha():
+                # multi-word tokens keep a single space however they were separated
+                words = text.split()
+                self.tokens.append(Token(PHRASE_TYPES[words[0]], " ".join(words)))
+            else:
+                raise RuntimeError("Unknown token: %s" % self.string[self.string.index(text):].split()[0])
+        if spelled is not None:
+            self.tokens.append(Token(TokenType.NUMBER, sum(spelled)))
+        self.index = 0
 
     def __iter__(self):
         return self
 
-    def __next__(self):
-        try:
-            return next(self.next_token())
-        except StopIteration:
+    def __next__(self) -> Token:
+        if self.index >= len(self.tokens):
             return Token(TokenType.EOF, None)
-
-    def next_token(self):
-        for word in self.iterator:
-            word: str
-            if word in KEYWORDS:
-                yield Token(KEYWORDS[word], word)
-            elif word in ("clear", "cleared"):
-                yield Token(TokenType.CLEAR, word)
-            elif word in ("to", "for"):
-                yield Token(TokenType.PREPOSITION, word)
-            elif word == "go" and self.iterator.peek() == "around":
-                next(self.iterator)
-                yield Token(TokenType.GO_AROUND, "go around")
-            elif word == "line" and self.iterator.peek() == "up":
-                next(self.iterator)
-                yield Token(TokenType.LINE_UP, "line up")
-            elif word == "good" and self.iterator.peek() in ("morning", "afternoon", "evening"):
-                value = "%s %s" % (word, self.iterator.peek())
-                next(self.iterator)
-                yield Token(TokenType.GREETING, value)
-            elif word.isnumeric():
-                yield Token(TokenType.NUMBER, int(word))
-            elif word.isalpha():
-                yield Token(TokenType.WORD, word)
-            else:
-                raise RuntimeError("Unknown token: %s" % word)
-
+        self.index += 1
+        return self.tokens[self.index - 1]
@@ -1,161 +1,108 @@
-from compiler.lexer import Lexer, TokenType, Token
-from aircraft import Instruction
-from compiler.data import get_airline_from_callsign, Airline
-
+import functools
 
+from compiler.grammar import Grammar, Node
+from compiler.lexer import Lexer, Token
+from aircraft import Instruction
+from compiler.data import airline_code, get_airline_from_callsign, Airline
+
+PARSE_CACHE_SIZE = 1024
+SIDES = {"left": "l", "right": "r", "center": "c", "centre": "c", "l": "l", "r": "r", "c": "c"}
+NATO_ALPHABET = ("alfa", "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet",
+                 "juliett", "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango",
+                 "uniform", "victor", "whiskey", "xray", "yankee", "zulu")
+
+
+def callsign(words: list[str], number: int) -> str:
+    if len(words) > 1 and all(word in NATO_ALPHABET for word in words):
+        # spelled airline code, "lima hotel 4713"
+        return "".join(word[0] for word in words).upper() + str(number)
+    ret = "".join(words).upper()
+    airline: Airline = get_airline_from_callsign(ret)
+    if airline is not None and airline_code(airline) is not None:
+        ret = airline_code(airline)
+    return ret + str(number)
+
+
+def side(word: str) -> str:
+    if word not in SIDES:
+        raise RuntimeError("Unknown runway side %s" % word)
+    return SIDES[word]
+
+
+def heading(value: int) -> int:
+    if not 1 <= value <= 360:
+        raise RuntimeError("Invalid heading %s" % value)
+    return value
+
+
+# What every rule of the grammar evaluates to, given the values of its children. Tokens evaluate to
+# their value, rules without an action to None. Ignored children are not listed.
+ACTIONS = {
+    "expression": lambda v: (v[1],) + v[3],
+    "exp_start": lambda v: v[1],
+    "callsign": lambda v: callsign(v[0], v[1]),
+    "airline": lambda v: [v[0]] + v[1] if v else [],
+    "airline_word": lambda v: v[0],
+    "words": lambda v: [v[0]] + v[1] if v else [],
+    "command": lambda v: v[0],
+    "clearance": lambda v: v[2],
+    "cleared": lambda v: v[0],
+    "takeoff_clr": lambda v: (Instruction.TAKEOFF, v[1]),
+    "cross_clr": lambda v: (Instruction.CROSS, v[1]),
+    "landing_clr": lambda v: (Instruction.LAND, v[2]),
+    "pushback": lambda v: (Instruction.PUSHBACK, ""),
+    "taxi_clr": lambda v: (Instruction.TAXI, v[3] + [v[2]]),
+    "destination": lambda v: v[0],
+    "gate": lambda v: v[1][:1] + str(v[2]),
+    "via": lambda v: v[1] if v else [],
+    "taxiways": lambda v: [v[0]] + v[1],
+    "hold_exp": lambda v: (Instruction.HOLD, v[1]),
+    "hold_at": lambda v: v[1] if len(v) == 2 else "",
+    "cont_taxi": lambda v: (Instruction.CONTINUE, ""),
+    "abort_to": lambda v: (Instruction.ABORT, ""),
+    "line_up_exp": lambda v: (Instruction.LINE_UP, v[2]),
+    "go_around": lambda v: (Instruction.GO_AROUND, ""),
+    "heading_exp": lambda v: (Instruction.HEADING, heading(v[-1])),
+    "height_exp": lambda v: (Instruction.ALTITUDE, v[2]),
+    "height": lambda v: v[0] if len(v) == 2 else v[2] * 100,
+    "speed_exp": lambda v: (Instruction.SPEED, v[2]),
+    "runway": lambda v: "{}{}".format(v[1], v[2]),
+    "side": lambda v: side(v[0]) if v else "",
+}
+
+
+def evaluate(node: Node | Token):
+    if isinstance(node, Token):
+        return node.value
+    action = ACTIONS.get(node.rule)
+    if action is None:
+        return None
+    return action([evaluate(child) for child in node.children])
+
+
+grammar: Grammar | None = None
+
+
+def get_grammar() -> Grammar:
+    global grammar
+    if grammar is None:
+        grammar = Grammar.load()
+    return grammar
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_phrase(phrase: tuple[Token, ...]) -> tuple[str, Instruction, object]:
+    return evaluate(get_grammar().parse(list(phrase)))
+
+
+# Parses a command with the LL(1) grammar of the "grammer" spec. Results are cached by the normalized
+# phrase, the lexed tokens, so repeated commands skip parsing however they were spelled or spaced.
 class Parser:
-    lookahead: Token
 
     def __init__(self, lexer: Lexer):
         self.input = lexer
-        self.consume()
-
-    def match(self, x: TokenType):
-        if self.lookahead.token_type == x:
-            self.consume()
-        else:
-            raise RuntimeError("Parsing exception. Expected %s but was %s" % (x.name, self.lookahead))
-
-    def consume(self):
-        self.lookahead = next(self.input)
-
-    def valid(self):
-        ret = self.expression()
-        if self.lookahead.token_type is not TokenType.EOF:
-            raise RuntimeError("Parsing exception. Expected EOF, but was %s" % self.lookahead)
-        return ret
-
-    def expression(self):
-        meta = ""
-        if self.lookahead.token_type == TokenType.GREETING:
-            self.match(TokenType.GREETING)
-        callsign = self.exp_start()
-        if self.lookahead.token_type == TokenType.GREETING:
-            self.match(TokenType.GREETING)
-        if self.lookahead.token_type == TokenType.CLEAR:
-            meta, instruction = self.clearance()
-        elif self.lookahead.token_type == TokenType.HOLD:
-            self.hold_exp()
-            instruction = Instruction.HOLD
-        elif self.lookahead.token_type == TokenType.CONTINUE:
-            self.cont_taxi()
-            instruction = Instruction.CONTINUE
-        elif self.lookahead.token_type == TokenType.ABORT:
-            self.abort_to()
-            instruction = Instruction.ABORT
-        elif self.lookahead.token_type == TokenType.LINE_UP:
-            self.line_up_exp()
-            instruction = Instruction.LINE_UP
-        elif self.lookahead.token_type == TokenType.GO_AROUND:
-            self.match(TokenType.GO_AROUND)
-            instruction = Instruction.GO_AROUND
-        elif self.lookahead.token_type == TokenType.TAXI:
-            meta = self.taxi_clr()
-            instruction = Instruction.TAXI
-        else:
-            raise RuntimeError()
-        return callsign, instruction, meta
-
-    def exp_start(self) -> str:
-        ret: str = ""
-        if self.lookahead.token_type == TokenType.FLIGHT:
-            self.match(TokenType.FLIGHT)
-        while self.lookahead.token_type == TokenType.WORD:
-            ret += self.lookahead.value.upper()
-            self.match(TokenType.WORD)
-        airline: Airline = get_airline_from_callsign(ret)
-        if airline is not None:
-            ret = airline.iata
-            if len(ret) == 0:
-                ret = airline.icao
-        ret += str(self.lookahead.value)
-        self.match(TokenType.NUMBER)
-        return ret
-
-    def clearance(self) -> tuple[str, Instruction]:
-        self.match(TokenType.CLEAR)
-        if self.lookahead.token_type == TokenType.PREPOSITION:
-            self.match(TokenType.PREPOSITION)
-        if self.lookahead.token_type == TokenType.TAKEOFF:
-            self.takeoff_clr()
-            return "", Instruction.TAKEOFF
-        elif self.lookahead.token_type == TokenType.CROSS:
-            self.cross_clr()
-        elif self.lookahead.token_type == TokenType.LAND:
-            return self.landing_clr()
-        elif self.lookahead.token_type == TokenType.TAXI:
-            self.taxi_clr()
-        elif self.lookahead.token_type == TokenType.PUSHBACK:
-            self.match(TokenType.PUSHBACK)
-            return "", Instruction.PUSHBACK
-        else:
-            raise RuntimeError()
-
-    def takeoff_clr(self):
-        self.match(TokenType.TAKEOFF)
-        self.runway()
-        # if self.lookahead.token_type == TokenType.WIND:
-        #     self.match(TokenType.WIND)
-        # TODO wind
-
-    def cross_clr(self):
-        self.match(TokenType.CROSS)
-        self.runway()
-
-    def landing_clr(self) -> tuple[str, Instruction]:
-        self.match(TokenType.LAND)
-        if self.lookahead.token_type == TokenType.PREPOSITION:
-            self.match(TokenType.PREPOSITION)
-        return self.runway(), Instruction.LAND
-
-    def taxi_clr(self) -> list[str]:
-        points: list[str] = []
-        goal: str = ""
-        self.match(TokenType.TAXI)
-        if self.lookahead.token_type == TokenType.PREPOSITION:
-            self.match(TokenType.PREPOSITION)
-        if self.lookahead.token_type == TokenType.RUNWAY:
-            goal = self.runway()
-        elif self.lookahead.token_type == TokenType.GATE:
-            self.match(TokenType.GATE)
-            goal = self.lookahead.value.lower()[:1]
-            self.match(TokenType.WORD)
-            goal += str(self.lookahead.value)
-            self.match(TokenType.NUMBER)
-        if self.lookahead.token_type == TokenType.VIA:
-            self.match(TokenType.VIA)
-            while self.lookahead.token_type == TokenType.WORD:
-                points.append(self.lookahead.value)
-                self.match(TokenType.WORD)
-        points.append(goal)
-        return points
-
-    def hold_exp(self):
-        self.match(TokenType.HOLD)
-        if self.lookahead.token_type == TokenType.SHORT:
-            self.match(TokenType.SHORT)
-        elif self.lookahead.token_type == TokenType.POS:
-            self.match(TokenType.POS)
-
-    def cont_taxi(self):
-        self.match(TokenType.CONTINUE)
-        self.match(TokenType.TAXI)
-
-    def abort_to(self):
-        self.match(TokenType.ABORT)
-        self.match(TokenType.TAKEOFF)
-
-    def line_up_exp(self):
-        self.match(TokenType.LINE_UP)
-        if self.lookahead.token_type == TokenType.WAIT:
-            self.match(TokenType.WAIT)
-
-    def runway(self) -> str:
-        if self.lookahead.token_type == TokenType.RUNWAY:
-            self.match(TokenType.RUNWAY)
-        runway = self.lookahead.value
-        self.match(TokenType.NUMBER)
-        if self.lookahead.token_type == TokenType.WORD:
-            self.match(TokenType.WORD)
-            runway += self.lookahead.value
-        return runway
\ No newline at end of file
+
+    def valid(self) -> tuple[str, Instruction, object]:
+        callsign, instruction, meta = parse_phrase(tuple(self.input.tokens))
+        # the cached meta is shared between callers
+        return callsign, instruction, list(meta) if isinstance(meta, list) else meta
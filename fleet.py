@@ -0,0 +1,134 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TURN_SPEED = 10  # degree / s
+VERT_SPEED = 30  # ft / s
+ACCEL = 3  # kt / s
+
+COLUMNS = ("x", "y", "heading", "acl_heading", "speed", "acl_speed", "altitude", "acl_altitude")
+
+
+# Attribute of an aircraft that is stored in a column of its fleet. Reading or writing it on the aircraft
+# reads or writes the fleet array, so the aircraft objects are views onto the fleet.
+class FleetField:
+    def __init__(self, column: str):
+        self.column = column
+
+    def __get__(self, aircraft, owner=None):
+        if aircraft is None:
+            return self
+        return getattr(aircraft._fleet, self.column)[aircraft._slot]
+
+    def __set__(self, aircraft, value):
+        getattr(aircraft._fleet, self.column)[aircraft._slot] = value
+
+
+# Kinematic state of many aircraft as one array per quantity. With NumPy the whole fleet is advanced in
+# one vectorized step, without it the columns are lists and every aircraft moves itself.
+# step() reports the aircraft that crossed a border of a cell_size grid, so a spatial index over the fleet
+# only has to be touched for those.
+class Fleet:
+    def __init__(self, capacity: int = 16, vectorized: bool | None = None, cell_size: float = 64):
+        self.vectorized = np is not None if vectorized is None else vectorized
+        self.cell_size = cell_size
+        self.capacity = 0
+        for column in COLUMNS + ("cell_x", "cell_y"):
+            setattr(self, column, np.zeros(0) if self.vectorized else [])
+        self.active = np.zeros(0, dtype=bool) if self.vectorized else []
+        self._aircraft: list = []
+        self._free: list[int] = []
+        self._grow(max(1, capacity))
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        if self.vectorized:
+            for column in COLUMNS + ("cell_x", "cell_y"):
+                setattr(self, column, np.concatenate((getattr(self, column), np.zeros(extra))))
+            self.active = np.concatenate((self.active, np.zeros(extra, dtype=bool)))
+        else:
+            for column in COLUMNS + ("cell_x", "cell_y"):
+                getattr(self, column).extend([0.0] * extra)
+            self.active.extend([False] * extra)
+        self._aircraft.extend([None] * extra)
+        # free slots are popped from the end, lowest slot first
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def allocate(self, aircraft) -> int:
+        if not self._free:
+            self._grow(self.capacity * 2)
+        slot = self._free.pop()
+        self._aircraft[slot] = aircraft
+        return slot
+
+    def attach(self, aircraft):
+        # moves the state of an aircraft from whichever fleet it is in into this one and activates it
+        if aircraft._fleet is not self:
+            old_fleet, old_slot = aircraft._fleet, aircraft._slot
+            slot = self.allocate(aircraft)
+            for column in COLUMNS:
+                getattr(self, column)[slot] = getattr(old_fleet, column)[old_slot]
+            old_fleet.release(old_slot)
+            aircraft._fleet, aircraft._slot = self, slot
+        slot = aircraft._slot
+        self.cell_x[slot] = self.x[slot] // self.cell_size
+        self.cell_y[slot] = self.y[slot] // self.cell_size
+        self.active[slot] = True
+
+    def detach(self, aircraft):
+        # gives the aircraft a fleet of its own, so it keeps its state after leaving this one
+        Fleet(1, vectorized=False).attach(aircraft)
+
+    def release(self, slot: int):
+        self.active[slot] = False
+        self._aircraft[slot] = None
+        for column in COLUMNS:
+            getattr(self, column)[slot] = 0.0
+        self._free.append(slot)
+
+    def step(self, dt: float) -> list:
+        # returns the aircraft that moved into another cell
+        if not self.vectorized:
+            crossed = []
+            for slot, aircraft in enumerate(self._aircraft):
+                if self.active[slot]:
+                    aircraft.move(dt)
+                    cell_x = self.x[slot] // self.cell_size
+                    cell_y = self.y[slot] // self.cell_size
+                    if cell_x != self.cell_x[slot] or cell_y != self.cell_y[slot]:
+                        self.cell_x[slot] = cell_x
+                        self.cell_y[slot] = cell_y
+                        crossed.append(aircraft)
+            return crossed
+
+        active = self.active
+        accel = ACCEL * dt
+        self.acl_speed += np.where(active, np.clip(self.speed - self.acl_speed, -accel, accel), 0)
+
+        moving = active & (self.acl_speed != 0)
+        turn = TURN_SPEED * dt * np.abs(self.acl_speed) * 0.1
+        div_left = (360 + self.acl_heading - self.heading) % 360
+        div_right = (360 + self.heading - self.acl_heading) % 360
+        turn_left = np.minimum(self.heading - self.acl_heading, turn)
+        turn_right = -np.minimum(self.acl_heading - self.heading, turn)
+        self.acl_heading += np.where(moving, np.where(div_left > div_right, turn_left, turn_right), 0)
+
+        climb = VERT_SPEED * dt
+        self.acl_altitude += np.where(moving, np.clip(self.altitude - self.acl_altitude, -climb, climb), 0)
+
+        angle = np.radians(self.acl_heading + 90)
+        distance = np.where(moving, dt * (self.acl_speed / 10), 0)
+        self.x -= distance * np.cos(angle)
+        self.y -= distance * np.sin(angle)
+
+        cell_x = self.x // self.cell_size
+        cell_y = self.y // self.cell_size
+        crossed = moving & ((cell_x != self.cell_x) | (cell_y != self.cell_y))
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        return [self._aircraft[slot] for slot in np.flatnonzero(crossed)]
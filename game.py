@@ -1,164 +1,150 @@
+import argparse
+import os
 import pygame
-import threading
-import queue
 import random
-import re
-
-import speech_recognition as sr
+import threading
+import time
 
-from aircraft import AiAircraft
-from airport import Airport
+import assets
+import speech
+from command_bus import CommandBus, Feedback
 from compiler.lexer import Lexer
 from compiler.parser import Parser
+from profiler import Profiler
+from recording import Recorder
+from renderer import Renderer
+from layout import DEFAULT_LAYOUT
+from simulation import new_session
 from textio import InputBox
 
-instructions = queue.Queue()
-inbound = queue.Queue()
-inbound_timer: threading.Timer | None = None
+RECORDINGS = "recordings"
+PROFILES = "profiles"
 
-timers = []
-boarding_timer: threading.Timer | None = None
+commands = CommandBus()
 
 
-def input_handler():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Say something!")
-        audio = r.listen(source)
+def text_input_handler():
+    input_str = input("Command: ")
     try:
-        input_str = r.recognize_google(audio)
-        print(input_str)
-        parser = Parser(Lexer(input_str))
-        instructions.put(parser.valid())
-    except sr.UnknownValueError:
-        print("Google Speech Recognition could not understand audio")
-    except sr.RequestError as e:
-        print("Could not request results from Google Speech Recognition service; {}".format(e))
+        commands.submit(*Parser(Lexer(input_str)).valid(), "console")
+    except RuntimeError as e:
+        print("Unknown command", e.args)
 
 
-def text_input_handler():
-    input_str = input("Command: ")
-    input_str = re.sub(r"([a-zA-Z]+)(\d+)", "%1 %2", input_str)
-    parser = Parser(Lexer(input_str))
-    instructions.put(parser.valid())
-
-
-def start_boarding(airport: Airport):
-    global boarding_timer
-    for aircraft in airport.aircraft:
-        if aircraft.timer is None:
-            aircraft.start_boarding(1, 60)
-            break
-
-    if boarding_timer and not boarding_timer.is_alive():
-        boarding_timer = threading.Timer(180, start_boarding, args=(airport,))
-        boarding_timer.start()
-
-def handle_inbound(airport: Airport):
-    global inbound
-    global inbound_timer
-    if not inbound.empty():
-        inbound.get(timeout=5)
-        airport.add_aircraft(AiAircraft.inbound_aircraft(airport))
-        inbound_timer = threading.Timer(20, handle_inbound, args=(airport,))
-        inbound_timer.start()
-        inbound.task_done()
-
-def handle_inbound_queue(airport: Airport):
-    global inbound
-    global inbound_timer
-    inbound.put(airport)
-    if not inbound_timer or not inbound_timer.is_alive():
-        handle_inbound(airport)
-
-def game():
+def report_feedback(feedback: Feedback):
+    print(feedback)
+
+
+def game(layout: str = DEFAULT_LAYOUT):
     # pygame setup
     pygame.init()
     screen = pygame.display.set_mode((1280, 720))
     pygame.display.set_caption('ATC Controller')
-
-    background = pygame.Surface(screen.get_size())
-    background = background.convert()
-    background.fill((40, 40, 40))
-
-    airport = Airport(background, "Rocky Mountain Regional")
-
-    for gate in airport.gates:
-        airport.add_aircraft(AiAircraft.parked_aircraft(airport, gate))
-
-    font = pygame.font.SysFont("Helvetica", 36)
-    font_object = font.render("Rocky Mountain Regional", True, (255, 255, 255))
+    assets.cache.preload()
+
+    # every session is recorded, replay it with python recording.py
+    seed = random.randrange(2 ** 32)
+    sim = new_session(seed, screen.get_size(), commands=commands, layout=layout)
+    airport = sim.airport
+    background = airport.background()
+    commands.add_listener(report_feedback)
+    os.makedirs(RECORDINGS, exist_ok=True)
+    recorder = Recorder(sim, os.path.join(RECORDINGS, time.strftime("%Y%m%d-%H%M%S.atcr")))
+    print("Session seed {}, recording to {}".format(seed, recorder.path))
+    renderer = Renderer(airport, background)
+    # F3 shows the frame timings, F4 exports them
+    profiler = Profiler()
+    airport.profiler = profiler
+
+    font = assets.cache.font(assets.FONT_NAME, 36)
+    font_object = font.render(airport.name, True, (255, 255, 255))
     background.blit(font_object, (50, 50))
 
-    input_box = InputBox(0, screen.get_height() - 40, 1000, 40, instructions)
+    input_box = InputBox(0, screen.get_height() - 40, 1000, 40, commands)
 
     clock = pygame.time.Clock()
     running = True
     dt = 0
+    # the caption shows the speed of the clock, it is only set again when that changes
+    caption = None
 
-    start_boarding(airport)
-    start_boarding(airport)
-    start_boarding(airport)
-    global boarding_timer
-    boarding_timer = threading.Timer(180, start_boarding, args=(airport,))
-    boarding_timer.start()
+    voice = speech.create_pipeline(commands)
+    if voice is not None:
+        voice.start()
 
     screen.blit(background, (0, 0))
     pygame.display.update()
 
     while running:
+        profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                for timer in timers:
-                    timer.cancel()
-                for aircraft in airport.aircraft:
-                    if aircraft.timer:
-                        aircraft.timer.cancel()
                 running = False
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_m and not input_box.active:
-                threading.Thread(target=input_handler, daemon=True).start()
+            elif (event.type == pygame.KEYDOWN and event.key == pygame.K_m and voice is not None
+                    and not input_box.active):
+                voice.listening = not voice.listening
+                print("Voice commands", "on" if voice.listening else "muted")
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_n and not input_box.active:
                 threading.Thread(target=text_input_handler, daemon=True).start()
+            elif (event.type == pygame.KEYDOWN and event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS)
+                    and not input_box.active):
+                sim.clock.faster()
+            elif (event.type == pygame.KEYDOWN and event.key in (pygame.K_MINUS, pygame.K_KP_MINUS)
+                    and not input_box.active):
+                sim.clock.slower()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE and not input_box.active:
+                sim.clock.paused = not sim.clock.paused
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+                renderer.set_full_redraw(not renderer.full_redraw)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                os.makedirs(PROFILES, exist_ok=True)
+                name = os.path.join(PROFILES, time.strftime("%Y%m%d-%H%M%S"))
+                profiler.export(name + ".csv")
+                profiler.export(name + ".json")
+                print("Profile exported to {}.csv and .json".format(name))
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_PAGEUP:
+                airport.status_board.page(1)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_PAGEDOWN:
+                airport.status_board.page(-1)
+            elif event.type == pygame.MOUSEWHEEL:
+                airport.status_board.scroll(event.y)
+            elif event.type == pygame.MOUSEBUTTONDOWN and not input_box.rect.collidepoint(event.pos):
+                aircraft = renderer.aircraft_at(event.pos)
+                if aircraft is not None:
+                    renderer.toggle_route(aircraft)
             input_box.handle_event(event)
 
-        for timer in timers:
-            if not timer.is_alive():
-                timers.remove(timer)
-
-        if (len(airport.gates) > len(airport.aircraft) + len(timers)
-                and airport.number_of_landing_aircraft() < 3
-                and len(timers) < 3):
-            t = random.randint(1, 60)
-            print("Started timer for {} sec...".format(t))
-            timer = threading.Timer(t, handle_inbound_queue, (airport,))
-            timers.append(timer)
-            timer.start()
-
-        while instructions.not_empty:
-            try:
-                callsign, instruction, meta = instructions.get_nowait()
-            except queue.Empty:
-                break
-            for a in airport.aircraft:
-                a: AiAircraft
-                if a.callsign == callsign:
-                    a.set_instruction(instruction, meta)
-                    instructions.task_done()
-                    break
+        profiler.mark("events")
         input_box.update()
-        screen.blit(background, (0, 0))
-        input_box.draw(screen)
-        airport.update(dt)
-        airport.draw_aircraft_status(screen)
-        for a in airport.aircraft:
-            screen.blit(a.track, (0, 0))
-            if a.is_outside_game():
-                airport.aircraft.remove(a)
-        pygame.display.update()
+        sim.advance(dt)
+        profiler.mark("simulation")
+        if str(sim.clock) != caption:
+            caption = str(sim.clock)
+            pygame.display.set_caption('ATC Controller ({})'.format(caption))
+        renderer.draw(screen)
+        profiler.mark("render")
+        renderer.mark_dirty(airport.draw_aircraft_status(screen))
+        profiler.mark("status")
+        renderer.mark_dirty(input_box.draw(screen))
+        renderer.mark_dirty(profiler.draw(screen))
+        profiler.mark("overlays")
+        renderer.present()
+        profiler.mark("display")
+        profiler.end_frame()
         dt = clock.tick(60) / 1000  # limits FPS to 60
 
+    print("Asset cache:", assets.cache)
+    print("Commands:", commands)
+    recorder.close()
+    if voice is not None:
+        voice.stop()
+        print("Voice:", voice)
     pygame.quit()
 
 
 if __name__ == '__main__':
-    game()
+    parser = argparse.ArgumentParser(description="Play the ATC game.")
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, help="layout file of the airport")
+    game(parser.parse_args().layout)
@@ -2,6 +2,11 @@ import heapq
 
 import pygame
 
+from spatial import SpatialHash
+
+WAYPOINT_CELL_SIZE = 50  # px
+PATH_CACHE_SIZE = 4096
+
 
 class Waypoint:
 
@@ -18,9 +23,31 @@ class Waypoint:
 class GroundMap:
     def __init__(self):
         self._points = {}
+        self._index = SpatialHash(WAYPOINT_CELL_SIZE)
+        # start point -> previous point on the shortest path from start, for every reachable point
+        self._routes: dict[str, dict[str, str | None]] = {}
+        # (start point, end point) -> path, for starts without a precomputed tree
+        self._paths: dict[tuple[str, str], tuple[str, ...]] = {}
 
     def add_point(self, point: Waypoint):
+        if point.name in self._index:
+            self._index.remove(point.name)
         self._points[point.name] = point
+        self._index.insert(point.name, (point.x, point.y))
+        self.invalidate_routes()
+
+    def add_edge(self, point1_name: str, point2_name: str):
+        self._points[point1_name].connected_points.append(point2_name)
+        self.invalidate_routes()
+
+    def invalidate_routes(self):
+        # has to be called after changing connected_points directly
+        self._routes.clear()
+        self._paths.clear()
+
+    def precompute_routes(self):
+        for name in self._points:
+            self._route_tree(name)
 
     def get_point(self, name: str) -> Waypoint | None:
         return self._points.get(name, None)
@@ -29,15 +56,16 @@ class GroundMap:
         for _, point in self._points.items():
             point.draw(surface)
 
-    def find_closest(self, postion: tuple[float, float]):
-        closest_point = None
-        closest_distance = float("inf")
-        for _, point in self._points.items():
-            manhattan_distance = abs(point.x - postion[0]) + abs(point.y - postion[1])
-            if manhattan_distance < closest_distance:
-                closest_distance = manhattan_distance
-                closest_point = point
-        return closest_point.name
+    def _position_of(self, name: str) -> tuple[int, int]:
+        point = self._points[name]
+        return point.x, point.y
+
+    def find_closest(self, postion: tuple[float, float]) -> str | None:
+        closest = self._index.nearest(postion, 1, self._position_of)
+        return closest[0] if closest else None
+
+    def find_k_closest(self, postion: tuple[float, float], k: int) -> list[str]:
+        return self._index.nearest(postion, k, self._position_of)
 
     def manhattan_distance(self, point1_name: str, point2_name: str) -> int:
         point1 = self._points[point1_name]
@@ -52,21 +80,75 @@ class GroundMap:
         heapq.heappush(heap, (0, start_point))
 
         while len(heap) > 0:
-            _, point = heapq.heappop(heap)
+            distance, point = heapq.heappop(heap)
+            if distance > distances[point]:
+                # stale entry, point was settled with a shorter distance
+                continue
             for connected_point in self._points[point].connected_points:
-                alternative = distances[point] + self.manhattan_distance(point, connected_point)
-                try:
-                    distances[connected_point]
-                except KeyError:
-                    distances[connected_point] = 9999
-                if alternative < distances[connected_point]:
+                alternative = distance + self.manhattan_distance(point, connected_point)
+                if alternative < distances.get(connected_point, float("inf")):
                     distances[connected_point] = alternative
                     previous_points[connected_point] = point
                     heapq.heappush(heap, (alternative, connected_point))
         return distances, previous_points
 
+    def a_star(self, start_point: str, end_point: str) -> list[str] | None:
+        # Edge costs are the Manhattan distances between waypoints, so the Manhattan distance to the end
+        # point never overestimates and the first time the end point is popped its path is the shortest.
+        # Returns None if the end point can not be reached.
+        end = self._points[end_point]
+        remaining = self.manhattan_distance(start_point, end_point)
+        # ties on the estimate go to the entry closer to the end point
+        heap = [(remaining, remaining, 0, start_point)]
+        distances = {start_point: 0}
+        previous_points = {start_point: None}
+
+        while heap:
+            _, _, distance, point = heapq.heappop(heap)
+            if point == end_point:
+                path = []
+                while point is not None:
+                    path.append(point)
+                    point = previous_points[point]
+                path.reverse()
+                return path
+            if distance > distances[point]:
+                continue
+            for connected_point in self._points[point].connected_points:
+                alternative = distance + self.manhattan_distance(point, connected_point)
+                if alternative < distances.get(connected_point, float("inf")):
+                    distances[connected_point] = alternative
+                    previous_points[connected_point] = point
+                    connected = self._points[connected_point]
+                    remaining = abs(connected.x - end.x) + abs(connected.y - end.y)
+                    heapq.heappush(heap, (alternative + remaining, remaining, alternative, connected_point))
+        return None
+
+    def _route_tree(self, start_point: str) -> dict[str, str | None]:
+        previous_points = self._routes.get(start_point)
+        if previous_points is None:
+            _, previous_points = self.dijkstra(start_point)
+            self._routes[start_point] = previous_points
+        return previous_points
+
     def get_shortest_path(self, start_point: str, end_point: str):
-        _, previous_points = self.dijkstra(start_point)
+        if start_point not in self._points or end_point not in self._points:
+            raise RuntimeError("Unknown waypoint: %s" % (start_point if start_point not in self._points
+                                                          else end_point))
+        previous_points = self._routes.get(start_point)
+        if previous_points is None:
+            path = self._paths.get((start_point, end_point))
+            if path is None:
+                path = self.a_star(start_point, end_point)
+                if path is None:
+                    raise RuntimeError("No route from %s to %s" % (start_point, end_point))
+                if len(self._paths) >= PATH_CACHE_SIZE:
+                    del self._paths[next(iter(self._paths))]
+                path = self._paths[(start_point, end_point)] = tuple(path)
+            return list(path)
+
+        if end_point not in previous_points:
+            raise RuntimeError("No route from %s to %s" % (start_point, end_point))
         path = []
         point = end_point
         while point != start_point:
@@ -0,0 +1,127 @@
+import functools
+import hashlib
+import json
+import os
+
+import pygame
+
+from ground_map import GroundMap, Waypoint
+
+LAYOUTS = "resources/layouts"
+DEFAULT_LAYOUT = "resources/layouts/rocky_mountain_regional.json"
+BACKGROUND_CACHE = "resources/cache"
+RENDER_VERSION = 1  # part of the cache key, has to change with the way layouts are drawn
+
+
+# An airport as declared in a layout file: aprons, taxiway segments and curves, runways, labels, gates,
+# the waypoints of the ground map with their connections and the operations, the points and routes the
+# aircraft use. Coordinates are px on the screen, curve angles degrees counterclockwise from east like
+# pygame.draw.arc.
+class Layout:
+    def __init__(self, path: str = DEFAULT_LAYOUT):
+        self.path = path
+        with open(path, "rb") as file:
+            data = file.read()
+        self.digest = hashlib.sha1(data).hexdigest()
+        layout = json.loads(data)
+        self.name: str = layout["name"]
+        # ICAO code of the real airport the layout stands for, traffic comes from and goes to airports around it
+        self.icao: str | None = layout.get("icao")
+        self.aprons: list[list[float]] = layout.get("aprons", [])
+        self.taxiways: list[dict] = layout.get("taxiways", [])
+        self.curves: list[dict] = layout.get("curves", [])
+        self.runways: list[dict] = layout.get("runways", [])
+        self.labels: list[dict] = layout.get("labels", [])
+        self.gates: list[dict] = layout.get("gates", [])
+        self.waypoints: list[dict] = layout.get("waypoints", [])
+        self._read_operations(layout.get("operations"))
+
+    def _read_operations(self, operations: dict | None):
+        # how aircraft use the airport, the aircraft read every point and route they need from here
+        def get(section: dict | None, key: str, name: str = "operations"):
+            if not isinstance(section, dict):
+                raise RuntimeError("{}: layout has no {}".format(self.path, name))
+            if key not in section:
+                raise RuntimeError("{}: {} of the layout have no {}".format(self.path, name, key))
+            return section[key]
+
+        # runway in use and its waypoints: departures hold short at the entry, lift off at the exit where
+        # arrivals leave the runway again and wait at the hold point for their taxi clearance
+        self.runway: str = str(get(operations, "runway"))
+        self.runway_entry: str = get(operations, "entry")
+        self.runway_exit: str = get(operations, "exit")
+        self.runway_hold: str = get(operations, "hold")
+        # arrivals enter the map at this point with this heading
+        approach = get(operations, "approach")
+        self.approach: tuple[float, float] = tuple(get(approach, "at", "approach"))
+        self.approach_heading: float = get(approach, "heading", "approach")
+        # line up and pushback first move by the offset of via, then towards the point x px to the side of
+        # where they started at the absolute y of to, pushback turns with the given heading
+        self.line_up: dict = get(operations, "line_up")
+        self.pushback: dict = get(operations, "pushback")
+        for key in ("via", "to"):
+            get(self.line_up, key, "line_up")
+            get(self.pushback, key, "pushback")
+        get(self.pushback, "heading", "pushback")
+        # where a parked aircraft stands relative to the waypoint of its gate
+        self.gate_stand: tuple[float, float] = tuple(get(operations, "gate_stand"))
+        # runway or taxiway of a taxi clearance -> first and last waypoint of its leg, the leg of the runway
+        # ends at its entry. Taxi clearances to a gate start at the hold point.
+        self.taxi_out: dict[str, list[str]] = get(operations, "taxi_out")
+        self.taxi_in: dict[str, list[str]] = get(operations, "taxi_in")
+
+        if self.taxi_out.get(self.runway, [None])[-1] != self.runway_entry:
+            raise RuntimeError("{}: operations of the layout have no taxi route to the entry of runway {}".format(
+                self.path, self.runway))
+        known = {point["name"] for point in self.waypoints}
+        referenced = [self.runway_entry, self.runway_exit, self.runway_hold]
+        for route in list(self.taxi_out.values()) + list(self.taxi_in.values()):
+            if len(route) != 2:
+                raise RuntimeError("{}: taxi route {} is not a first and a last waypoint".format(self.path, route))
+            referenced += route
+        for name in referenced:
+            if name not in known:
+                raise RuntimeError("{}: operations of the layout use unknown waypoint {}".format(self.path, name))
+
+    def build_ground_map(self, ground_map: GroundMap):
+        # waypoints in the order of the file, then one per gate connected both ways to its taxiway
+        for point in self.waypoints:
+            ground_map.add_point(Waypoint(point["name"], *point["at"], list(point["connected"])))
+        for gate in self.gates:
+            name = "gate-{}".format(gate["name"].lower())
+            ground_map.add_point(Waypoint(name, *gate["waypoint"], [gate["taxiway"]]))
+            ground_map.add_edge(gate["taxiway"], name)
+        for point in self.waypoints:
+            for connected in point["connected"]:
+                if ground_map.get_point(connected) is None:
+                    raise RuntimeError("{}: waypoint {} is connected to unknown waypoint {}".format(
+                        self.path, point["name"], connected))
+
+    def cache_path(self, size: tuple[int, int]) -> str:
+        key = "{}-{}x{}-{}".format(self.digest, size[0], size[1], RENDER_VERSION)
+        return os.path.join(BACKGROUND_CACHE, key + ".png")
+
+    def load_background(self, size: tuple[int, int]) -> pygame.Surface | None:
+        # the background baked for this version of the layout file, None if there is none yet
+        path = self.cache_path(size)
+        if not os.path.exists(path):
+            return None
+        try:
+            background = pygame.image.load(path)
+        except pygame.error as e:
+            print("Ignoring cached background:", e)
+            return None
+        return background.convert() if pygame.display.get_surface() is not None else background
+
+    def save_background(self, background: pygame.Surface):
+        path = self.cache_path(background.get_size())
+        os.makedirs(BACKGROUND_CACHE, exist_ok=True)
+        # written next to the cache file and renamed, so a reader never sees half an image
+        pygame.image.save(background, path + ".tmp.png")
+        os.replace(path + ".tmp.png", path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_layout(path: str = DEFAULT_LAYOUT) -> Layout:
+    # layouts are read once per process, airports only read from them
+    return Layout(path)
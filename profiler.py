@@ -0,0 +1,154 @@
+import collections
+import csv
+import json
+import time
+
+import pygame
+
+import assets
+
+WINDOW = 300  # frames the percentiles are taken over, 5 s at 60 FPS
+TRACE_FRAMES = 36000  # frames kept for export, 10 minutes at 60 FPS
+HUD_INTERVAL = 30  # frames between two refreshes of the overlay text
+HUD_COLOR = (255, 255, 255)
+HUD_BACKGROUND = (0, 0, 0, 180)
+SLOWEST_AIRCRAFT = 3
+
+
+def percentile(ordered: list[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+# Times the stages of every frame. The game loop calls begin_frame() and then mark() after every stage,
+# a stage takes the time since the previous mark. Nested work, like the update of the airport within the
+# simulation stage, is added with add(). While disabled every call returns right away.
+class Profiler:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: list[str] = []
+        self.window: dict[str, collections.deque[float]] = {}
+        self.trace: collections.deque[tuple[float, dict[str, float]]] = collections.deque(maxlen=TRACE_FRAMES)
+        # callsign -> total s and number of updates within the WINDOW frames being collected, and within the
+        # last complete window, so aircraft that left drop out
+        self.aircraft_time: dict[str, float] = collections.defaultdict(float)
+        self.aircraft_updates: dict[str, int] = collections.defaultdict(int)
+        self._last_aircraft_window: tuple[dict[str, float], dict[str, int]] | None = None
+        self._aircraft_frames = 0
+        self._frame: dict[str, float] = {}
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._hud: pygame.Surface | None = None
+        self._frames_since_hud = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._hud = None
+        self._reset_aircraft()
+
+    def _reset_aircraft(self):
+        self.aircraft_time = collections.defaultdict(float)
+        self.aircraft_updates = collections.defaultdict(int)
+        self._last_aircraft_window = None
+        self._aircraft_frames = 0
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame = {}
+        self._frame_start = self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        if not self.enabled or not self._frame_start:
+            return
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+
+    def _register(self, stage: str):
+        if stage not in self.window:
+            self.stages.append(stage)
+            self.window[stage] = collections.deque(maxlen=WINDOW)
+
+    def add(self, stage: str, seconds: float):
+        self._register(stage)
+        self._frame[stage] = self._frame.get(stage, 0.0) + seconds
+
+    def add_aircraft(self, callsign: str, seconds: float):
+        self.aircraft_time[callsign] += seconds
+        self.aircraft_updates[callsign] += 1
+
+    def end_frame(self):
+        # the frame is the time from begin_frame() to the last mark
+        if not self.enabled or not self._frame_start:
+            return
+        self._register("frame")
+        self._frame["frame"] = self._last - self._frame_start
+        for stage in self.stages:
+            self.window[stage].append(self._frame.get(stage, 0.0))
+        self.trace.append((self._frame_start, self._frame))
+        self._frame_start = 0.0
+        self._frames_since_hud += 1
+        self._aircraft_frames += 1
+        if self._aircraft_frames >= WINDOW:
+            self._last_aircraft_window = (self.aircraft_time, self.aircraft_updates)
+            self.aircraft_time = collections.defaultdict(float)
+            self.aircraft_updates = collections.defaultdict(int)
+            self._aircraft_frames = 0
+
+    def percentiles(self, stage: str) -> tuple[float, float, float]:
+        ordered = sorted(self.window.get(stage, ()))
+        return percentile(ordered, 50), percentile(ordered, 95), percentile(ordered, 99)
+
+    def aircraft_window(self) -> tuple[dict[str, float], dict[str, int]]:
+        # total s and number of updates per callsign of the last complete window, of the frames so far before
+        return self._last_aircraft_window or (self.aircraft_time, self.aircraft_updates)
+
+    def slowest_aircraft(self, count: int = SLOWEST_AIRCRAFT) -> list[tuple[str, float]]:
+        # callsigns with the highest mean update time
+        times, updates = self.aircraft_window()
+        means = [(callsign, total / updates[callsign]) for callsign, total in times.items()]
+        return sorted(means, key=lambda item: -item[1])[:count]
+
+    def lines(self) -> list[str]:
+        lines = ["{:<10} {:>6} {:>6} {:>6}".format("ms", "p50", "p95", "p99")]
+        for stage in ["frame"] + [stage for stage in self.stages if stage != "frame"]:
+            lines.append("{:<10} {:>6.2f} {:>6.2f} {:>6.2f}".format(
+                stage, *(value * 1000 for value in self.percentiles(stage))))
+        for callsign, mean in self.slowest_aircraft():
+            lines.append("{:<10} {:>6.0f} us".format(callsign, mean * 1e6))
+        return lines
+
+    def draw(self, surface: pygame.Surface) -> pygame.Rect | None:
+        # the overlay in the top right corner, its text is refreshed every HUD_INTERVAL frames
+        if not self.enabled:
+            return None
+        if self._hud is None or self._frames_since_hud >= HUD_INTERVAL:
+            font = assets.cache.font(assets.FONT_NAME, 12)
+            rendered = [font.render(line, True, HUD_COLOR) for line in self.lines()]
+            width = max(text.get_width() for text in rendered) + 10
+            self._hud = pygame.Surface((width, len(rendered) * font.get_linesize() + 10), pygame.SRCALPHA)
+            self._hud.fill(HUD_BACKGROUND)
+            for i, text in enumerate(rendered):
+                self._hud.blit(text, (5, 5 + i * font.get_linesize()))
+            self._frames_since_hud = 0
+        return surface.blit(self._hud, (surface.get_width() - self._hud.get_width() - 5, 5))
+
+    def export(self, path: str):
+        # the trace as CSV, one row per frame and a column per stage in ms, or as JSON with the update
+        # times of the aircraft in the last window, depending on the extension of path
+        if path.endswith(".json"):
+            times, updates = self.aircraft_window()
+            with open(path, "w") as file:
+                json.dump({"stages": self.stages,
+                           "frames": [dict(frame, start=start) for start, frame in self.trace],
+                           "aircraft": {callsign: {"updates": updates[callsign], "total": total}
+                                        for callsign, total in times.items()}}, file)
+            return
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["start"] + self.stages)
+            for start, frame in self.trace:
+                writer.writerow(["{:.6f}".format(start)]
+                                + ["{:.3f}".format(frame.get(stage, 0.0) * 1000) for stage in self.stages])
@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import io
+import os
+import struct
+import time
+
+import snapshot
+from aircraft import Instruction, Status
+from simulation import TICK_RATE, Simulation, new_session
+from snapshot import COUNT, pack_string, state_digest, unpack_string
+
+MAGIC = b"ATCR"
+VERSION = 6
+CHECKPOINT_INTERVAL = 60 * TICK_RATE  # ticks between two checkpoints, one per minute of game time
+
+# magic, version, seed, tick rate, airport width and height, followed by the airport name and the path of
+# its layout file
+HEADER = struct.Struct("<4sHQHHH")
+MAX_SEED = 2 ** 64 - 1
+# type, tick, length of the payload that follows
+RECORD = struct.Struct("<BII")
+COMMAND, SPAWN, CHECKPOINT = range(3)
+# instruction, followed by the callsign as it was heard, the source and the meta
+COMMAND_FIELDS = struct.Struct("<B")
+# status, position, followed by the callsign
+SPAWN_FIELDS = struct.Struct("<Bdd")
+# aircraft, scheduled events, digest of the state, followed by a snapshot of the simulation
+CHECKPOINT_FIELDS = struct.Struct("<HI8s")
+
+# tags of the values a meta is made of
+NONE, INT, FLOAT, STR, LIST = range(5)
+
+
+def pack_value(value) -> bytes:
+    # metas are strings, numbers or lists of them
+    if value is None:
+        return struct.pack("<B", NONE)
+    if isinstance(value, int):
+        return struct.pack("<Bq", INT, value)
+    if isinstance(value, float):
+        return struct.pack("<Bd", FLOAT, value)
+    if isinstance(value, str):
+        return struct.pack("<B", STR) + pack_string(value)
+    if isinstance(value, (list, tuple)):
+        return struct.pack("<B", LIST) + COUNT.pack(len(value)) + b"".join(pack_value(item) for item in value)
+    raise RuntimeError("Cannot record {!r}".format(value))
+
+
+def unpack_value(data: bytes, offset: int) -> tuple[object, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == INT:
+        return struct.unpack_from("<q", data, offset)[0], offset + 8
+    if tag == FLOAT:
+        return struct.unpack_from("<d", data, offset)[0], offset + 8
+    if tag == STR:
+        return unpack_string(data, offset)
+    if tag == LIST:
+        items = []
+        count = COUNT.unpack_from(data, offset)[0]
+        offset += COUNT.size
+        for _ in range(count):
+            item, offset = unpack_value(data, offset)
+            items.append(item)
+        return items, offset
+    raise RuntimeError("Unknown value tag {}".format(tag))
+
+
+# Writes a session to an append-only log: the seed, every command the simulation drained, the aircraft
+# that spawned and a checkpoint every CHECKPOINT_INTERVAL ticks. The seed and the commands are all a
+# session depends on, spawns and checkpoints are there to notice when a replay takes a different path.
+# Checkpoints also hold a snapshot, so a replay can start at any of them.
+class Recorder:
+    def __init__(self, sim: Simulation, path: str, checkpoint_interval: int = CHECKPOINT_INTERVAL):
+        airport = sim.airport
+        if airport.seed is None:
+            raise RuntimeError("Only sessions of a seeded airport can be recorded")
+        if not 0 <= airport.seed <= MAX_SEED:
+            raise RuntimeError("Only sessions with a seed from 0 to {} can be recorded, not {}".format(
+                MAX_SEED, airport.seed))
+        self.sim = sim
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.records = 0
+        self._known: set[str] = set()
+        self._file = open(path, "wb")
+        try:
+            self._file.write(HEADER.pack(MAGIC, VERSION, airport.seed, TICK_RATE, airport.width, airport.height))
+            self._file.write(pack_string(airport.name) + pack_string(airport.layout.path))
+            self._record_spawns()
+        except (RuntimeError, struct.error, OSError) as e:
+            # no log is better than one that ends before the session starts
+            self._file.close()
+            os.remove(path)
+            raise RuntimeError("Cannot record to {}: {}".format(path, e)) from e
+        sim.commands.add_listener(self._record_command)
+        sim.add_observer(self)
+
+    def _write(self, record_type: int, payload: bytes):
+        self._file.write(RECORD.pack(record_type, self.sim.ticks, len(payload)) + payload)
+        self.records += 1
+
+    def _stop(self, error: Exception):
+        # the session goes on unrecorded, the log ends with the last complete record
+        print("Recording to {} stopped: {}".format(self.path, error))
+        self._file.close()
+
+    def _record_command(self, feedback):
+        # every drained command, rejected ones too, they are part of the batch the replay has to repeat
+        if self._file.closed:
+            return
+        command = feedback.command
+        try:
+            self._write(COMMAND, COMMAND_FIELDS.pack(command.instruction.value) + pack_string(command.heard)
+                        + pack_string(command.source) + pack_value(command.meta))
+        except (RuntimeError, struct.error, OSError) as e:
+            self._stop(e)
+
+    def _record_spawns(self):
+        callsigns = self.sim.airport.callsigns
+        for callsign in sorted(callsigns.keys() - self._known):
+            aircraft = callsigns[callsign]
+            self._write(SPAWN, SPAWN_FIELDS.pack(aircraft.get_status().value, *aircraft.get_position())
+                        + pack_string(callsign))
+        self._known = set(callsigns)
+
+    def checkpoint(self):
+        airport = self.sim.airport
+        self._write(CHECKPOINT, CHECKPOINT_FIELDS.pack(len(airport.aircraft), len(airport.scheduler),
+                                                       state_digest(airport)) + snapshot.save(self.sim))
+        self._file.flush()
+
+    def __call__(self, sim: Simulation):
+        if self._file.closed:
+            return
+        try:
+            if sim.airport.callsigns.keys() != self._known:
+                self._record_spawns()
+            if sim.ticks % self.checkpoint_interval == 0:
+                self.checkpoint()
+        except (RuntimeError, struct.error, OSError) as e:
+            self._stop(e)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.sim.remove_observer(self)
+        try:
+            self.checkpoint()
+        except (RuntimeError, struct.error, OSError) as e:
+            print("Recording to {} closed without a final checkpoint: {}".format(self.path, e))
+        self._file.close()
+
+
+class Record:
+    def __init__(self, record_type: int, tick: int, payload: bytes):
+        self.type = record_type
+        self.tick = tick
+        self.payload = payload
+
+    def command(self) -> tuple[str, Instruction, object, str]:
+        # callsign, instruction, meta and source of a command record
+        instruction = Instruction(COMMAND_FIELDS.unpack_from(self.payload)[0])
+        callsign, offset = unpack_string(self.payload, COMMAND_FIELDS.size)
+        source, offset = unpack_string(self.payload, offset)
+        meta, _ = unpack_value(self.payload, offset)
+        return callsign, instruction, meta, source
+
+    def spawn(self) -> tuple[str, Status, tuple[float, float]]:
+        status, x, y = SPAWN_FIELDS.unpack_from(self.payload)
+        return unpack_string(self.payload, SPAWN_FIELDS.size)[0], Status(status), (x, y)
+
+    def checkpoint(self) -> tuple[int, int, bytes]:
+        return CHECKPOINT_FIELDS.unpack_from(self.payload)
+
+    def snapshot(self) -> bytes:
+        return self.payload[CHECKPOINT_FIELDS.size:]
+
+
+class Recording:
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, self.seed, tick_rate, width, height = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise RuntimeError("{} is not a recording of version {}".format(path, VERSION))
+        if tick_rate != TICK_RATE:
+            raise RuntimeError("{} was recorded at {} ticks per second, not {}".format(path, tick_rate, TICK_RATE))
+        self.size = (width, height)
+        self.name, offset = unpack_string(data, HEADER.size)
+        self.layout, offset = unpack_string(data, offset)
+        self.records: list[Record] = []
+        while offset + RECORD.size <= len(data):
+            record_type, tick, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if offset + length > len(data):
+                # the end of a session that did not close its log
+                break
+            self.records.append(Record(record_type, tick, data[offset:offset + length]))
+            offset += length
+
+    def checkpoints(self) -> list[Record]:
+        return [record for record in self.records if record.type == CHECKPOINT]
+
+    def end(self) -> int:
+        return self.records[-1].tick if self.records else 0
+
+
+# Runs a recorded session again without a display, as fast as it goes. The recorded commands are given at
+# the tick they were drained at, spawns and checkpoints are compared with the replayed state.
+class Replayer:
+    def __init__(self, recording: Recording):
+        self.recording = recording
+        self.sim = new_session(recording.seed, recording.size, recording.name, layout=recording.layout)
+        self.divergences: list[str] = []
+        self._next = 0
+
+    def _advance_to(self, tick: int):
+        while self.sim.ticks < tick:
+            self.sim.step()
+
+    def run(self, until: int | None = None) -> Simulation:
+        # replays the records up to tick until, all of them if None
+        records = self.recording.records
+        while self._next < len(records) and (until is None or records[self._next].tick <= until):
+            record = records[self._next]
+            self._advance_to(record.tick)
+            self._check(record)
+            self._next += 1
+        if until is not None:
+            self._advance_to(until)
+        return self.sim
+
+    def seek(self, checkpoint: int) -> Simulation:
+        # the simulation restored from the checkpoint with this index, run() goes on from there
+        record = self.recording.checkpoints()[checkpoint]
+        self.sim = snapshot.restore(record.snapshot())
+        self._next = self.recording.records.index(record) + 1
+        return self.sim
+
+    def _check(self, record: Record):
+        airport = self.sim.airport
+        if record.type == COMMAND:
+            self.sim.commands.submit(*record.command())
+        elif record.type == SPAWN:
+            callsign, status, position = record.spawn()
+            if airport.get_aircraft(callsign) is None:
+                self.divergences.append("tick {}: {} did not spawn".format(record.tick, callsign))
+        elif record.type == CHECKPOINT:
+            count, events, digest = record.checkpoint()
+            if (count, events, digest) != (len(airport.aircraft), len(airport.scheduler), state_digest(airport)):
+                self.divergences.append("tick {}: state differs from the checkpoint, {} aircraft instead of {}"
+                                        .format(record.tick, len(airport.aircraft), count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session without a display.")
+    parser.add_argument("recording")
+    parser.add_argument("--until", type=int, help="stop at this tick")
+    parser.add_argument("--checkpoint", type=int, help="start at the checkpoint with this index")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the simulation")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    print("{}: seed {}, {} records, {} checkpoints, {} ticks".format(
+        args.recording, recording.seed, len(recording.records), len(recording.checkpoints()), recording.end()))
+    start = time.perf_counter()
+    with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+        replayer = Replayer(recording)
+        if args.checkpoint is not None:
+            replayer.seek(args.checkpoint)
+        first = replayer.sim.ticks
+        sim = replayer.run(args.until)
+    elapsed = time.perf_counter() - start
+    print("Replayed ticks {} to {} in {:.2f} s ({:.0f} ticks/s), {} aircraft".format(
+        first, sim.ticks, elapsed, (sim.ticks - first) / max(elapsed, 1e-9), len(sim.airport.aircraft)))
+    for divergence in replayer.divergences:
+        print("Diverged at", divergence)
+    if not replayer.divergences:
+        print("Replay matches the recording")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import pygame
+
+import assets
+from aircraft import Aircraft, Status
+from airport import Airport
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+TRACK_COLOR = (0, 0, 255)
+POSITION_COLOR = (255, 0, 0)
+
+
+class AircraftSprite(pygame.sprite.Sprite):
+    def __init__(self, aircraft: Aircraft):
+        pygame.sprite.Sprite.__init__(self)
+        self.aircraft = aircraft
+        self.original_image = assets.cache.sprite(assets.PLANE_IMAGE, assets.PLANE_SIZE)
+        font = assets.cache.font(assets.FONT_NAME, 10)
+        self.text = font.render(aircraft.callsign, True, WHITE)
+        self.image = pygame.transform.rotate(self.original_image, 180)
+        self.rect = self.image.get_rect(center=aircraft.get_position())
+        self.show_route = True
+
+    def update(self):
+        self.image = pygame.transform.rotate(self.original_image, -self.aircraft.get_heading())
+        self.rect = self.image.get_rect(center=self.aircraft.get_position())
+
+    def draw(self, screen: pygame.Surface) -> list[pygame.Rect]:
+        drawn = [screen.blit(self.image, self.rect)]
+        status = self.aircraft.get_status()
+        if status in (Status.READY_FOR_PUSHBACK, Status.PUSHBACK):
+            drawn.append(screen.blit(self.text, self.rect.move(-(self.text.get_width() - self.rect.width) / 2,
+                                                               4 - self.rect.height)))
+        elif status != Status.PARKED:
+            drawn.append(screen.blit(self.text, self.rect.move(-(self.text.get_width() - self.rect.width) / 2,
+                                                               self.rect.height + self.text.get_height() / 2)))
+        return drawn
+
+    def draw_live_leg(self, screen: pygame.Surface) -> list[pygame.Rect]:
+        # the leg from the aircraft to its next goal moves every frame, so it is not part of the overlay
+        drawn = []
+        position = self.aircraft.get_position()
+        goals = self.aircraft.get_goals()
+        if goals:
+            drawn.append(pygame.draw.line(screen, TRACK_COLOR, goals[0], position))
+        if screen.get_rect().collidepoint(position):
+            screen.set_at((int(position[0]), int(position[1])), POSITION_COLOR)
+            drawn.append(pygame.Rect(int(position[0]), int(position[1]), 1, 1))
+        return drawn
+
+
+# One shared layer holding the goal polylines of all aircraft. Only the areas of routes that changed since
+# the last frame are cleared and redrawn, so the cost does not grow with the number of aircraft.
+class RouteOverlay:
+    def __init__(self, size: tuple[int, int]):
+        self.surface = pygame.Surface(size)
+        self.surface.set_colorkey(BLACK)
+        self._routes: dict[Aircraft, tuple[tuple[float, float], ...]] = {}
+        self._bounds: dict[Aircraft, pygame.Rect] = {}
+
+    @staticmethod
+    def _route_bounds(route: tuple[tuple[float, float], ...]) -> pygame.Rect | None:
+        if not route:
+            return None
+        xs = [p[0] for p in route]
+        ys = [p[1] for p in route]
+        return pygame.Rect(min(xs) - 6, min(ys) - 6, max(xs) - min(xs) + 12, max(ys) - min(ys) + 12)
+
+    def _draw_route(self, route: tuple[tuple[float, float], ...]):
+        for i, goal in enumerate(route):
+            pygame.draw.rect(self.surface, TRACK_COLOR, (goal[0] - 5, goal[1] - 5, 10, 10), 10, 5)
+            if i > 0:
+                pygame.draw.line(self.surface, TRACK_COLOR, goal, route[i - 1])
+
+    def update(self, routes: dict[Aircraft, list[tuple[float, float]]]) -> list[pygame.Rect]:
+        dirty = []
+        for aircraft in [a for a in self._routes if a not in routes]:
+            del self._routes[aircraft]
+            bounds = self._bounds.pop(aircraft)
+            if bounds:
+                dirty.append(bounds)
+        for aircraft, goals in routes.items():
+            route = tuple(goals)
+            if self._routes.get(aircraft) == route:
+                continue
+            if self._bounds.get(aircraft):
+                dirty.append(self._bounds[aircraft])
+            self._routes[aircraft] = route
+            self._bounds[aircraft] = self._route_bounds(route)
+            if self._bounds[aircraft]:
+                dirty.append(self._bounds[aircraft])
+
+        for rect in dirty:
+            self.surface.set_clip(rect)
+            self.surface.fill(BLACK)
+            for aircraft, bounds in self._bounds.items():
+                if bounds and bounds.colliderect(rect):
+                    self._draw_route(self._routes[aircraft])
+        self.surface.set_clip(None)
+        return dirty
+
+
+# Only reads simulation state, the simulation runs the same with or without a renderer attached.
+# Unless full_redraw is set, only the rectangles drawn in this or the previous frame are restored from the
+# static background and pushed to the display.
+class Renderer:
+    def __init__(self, airport: Airport, background: pygame.Surface, full_redraw: bool = False):
+        self.airport = airport
+        self.background = background
+        self.full_redraw = full_redraw
+        self._sprites: dict[Aircraft, AircraftSprite] = {}
+        self.routes = RouteOverlay((airport.width, airport.height))
+        self._dirty: list[pygame.Rect] = []
+        self._previous: list[pygame.Rect] = []
+        self._force_full = True
+
+    def set_full_redraw(self, full_redraw: bool):
+        self.full_redraw = full_redraw
+        self._force_full = True
+
+    def mark_dirty(self, rect: pygame.Rect | None):
+        if rect:
+            self._dirty.append(rect)
+
+    def _restore(self, screen: pygame.Surface, rect: pygame.Rect):
+        screen.blit(self.background, rect, rect)
+        screen.blit(self.routes.surface, rect, rect)
+
+    def _sync(self):
+        for aircraft in self.airport.aircraft:
+            if aircraft not in self._sprites:
+                self._sprites[aircraft] = AircraftSprite(aircraft)
+        if len(self._sprites) != len(self.airport.aircraft):
+            active = set(self.airport.aircraft)
+            for aircraft in [a for a in self._sprites if a not in active]:
+                del self._sprites[aircraft]
+
+    def aircraft_at(self, position: tuple[int, int]) -> Aircraft | None:
+        for aircraft, sprite in self._sprites.items():
+            if sprite.rect.collidepoint(position):
+                return aircraft
+        return None
+
+    def set_show_route(self, aircraft: Aircraft, show: bool):
+        self._sync()
+        self._sprites[aircraft].show_route = show
+
+    def toggle_route(self, aircraft: Aircraft):
+        self.set_show_route(aircraft, not self._sprites[aircraft].show_route)
+
+    def draw(self, screen: pygame.Surface):
+        self._sync()
+        shown = [self._sprites[a] for a in self.airport.aircraft if self._sprites[a].show_route]
+        changed = self.routes.update({sprite.aircraft: sprite.aircraft.get_goals() for sprite in shown})
+        if self.full_redraw or self._force_full:
+            screen.blit(self.background, (0, 0))
+            screen.blit(self.routes.surface, (0, 0))
+        else:
+            for rect in self._previous + changed:
+                self._restore(screen, rect)
+            self._dirty.extend(changed)
+
+        for aircraft in self.airport.aircraft:
+            sprite = self._sprites[aircraft]
+            sprite.update()
+            self._dirty.extend(sprite.draw(screen))
+        for sprite in shown:
+            self._dirty.extend(sprite.draw_live_leg(screen))
+
+    def present(self):
+        if self.full_redraw or self._force_full:
+            pygame.display.update()
+        else:
+            pygame.display.update(self._previous + self._dirty)
+        self._previous = self._dirty
+        self._dirty = []
+        self._force_full = False
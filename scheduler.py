@@ -0,0 +1,55 @@
+import heapq
+from typing import Callable
+
+
+class Event:
+    def __init__(self, time: float, callback: Callable, args: tuple):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_pending(self) -> bool:
+        return not (self.cancelled or self.done)
+
+
+# Timers on simulation time. Events are kept in one priority queue and run from the main loop when the
+# simulation reaches their time, so they pause and speed up with the simulation clock and never run
+# concurrently with it.
+class Scheduler:
+    def __init__(self):
+        self.time = 0.0
+        self._queue: list[tuple[float, int, Event]] = []
+        self._sequence = 0
+
+    def __len__(self):
+        return sum(1 for _, _, event in self._queue if event.is_pending())
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Event:
+        return self.schedule_at(self.time + delay, callback, *args)
+
+    def schedule_at(self, time: float, callback: Callable, *args) -> Event:
+        event = Event(time, callback, args)
+        # the sequence number keeps events with the same time in the order they were scheduled
+        heapq.heappush(self._queue, (time, self._sequence, event))
+        self._sequence += 1
+        return event
+
+    def run_until(self, time: float):
+        while self._queue and self._queue[0][0] <= time:
+            event_time, _, event = heapq.heappop(self._queue)
+            if event.cancelled:
+                continue
+            self.time = event_time
+            event.done = True
+            event.callback(*event.args)
+        self.time = time
+
+    def cancel_all(self):
+        for _, _, event in self._queue:
+            event.cancel()
+        self._queue.clear()
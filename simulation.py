@@ -0,0 +1,235 @@
+import argparse
+import random
+import time
+from typing import Callable
+
+from aircraft import AiAircraft, Instruction, Status
+from airport import Airport
+from command_bus import CommandBus
+from layout import DEFAULT_LAYOUT, load_layout
+from scheduler import Event
+
+TICK = 0.1  # s the aircraft model advances per tick
+TICK_RATE = 60  # ticks per second of game time
+SPEEDS = (1, 2, 4, 16, None)  # None runs as many ticks as fit into a frame
+MAX_TICKS_PER_FRAME = 64
+MAX_SPEED_FRAME_BUDGET = 0.012  # s of wall time a frame may spend simulating at max speed
+
+BOARDING_INTERVAL = 180  # s between two parked aircraft starting to board
+INBOUND_SEPARATION = 20  # s between two inbound aircraft entering the map
+MAX_PENDING_INBOUND = 3
+MAX_LANDING_AIRCRAFT = 3
+
+AIRPORT_SIZE = (1280, 720)
+
+
+# Fixed timestep accumulator: wall time of the frames is converted into a whole number of ticks of
+# constant length, so the simulation does not depend on the frame rate and replays identically.
+class SimClock:
+    def __init__(self, speed: int | None = 1):
+        self.speed = speed
+        self.paused = False
+        self._accumulator = 0.0
+
+    def set_speed(self, speed: int | None):
+        self.speed = speed
+        self._accumulator = 0.0
+
+    def faster(self):
+        self.set_speed(SPEEDS[min(SPEEDS.index(self.speed) + 1, len(SPEEDS) - 1)])
+
+    def slower(self):
+        self.set_speed(SPEEDS[max(SPEEDS.index(self.speed) - 1, 0)])
+
+    def ticks_due(self, real_dt: float) -> int:
+        if self.paused or self.speed is None:
+            return 0
+        self._accumulator += real_dt * self.speed * TICK_RATE
+        ticks = int(self._accumulator)
+        self._accumulator -= ticks
+        # after a long stall the backlog is dropped instead of freezing the game while catching up
+        return min(ticks, MAX_TICKS_PER_FRAME * self.speed)
+
+    def __str__(self):
+        if self.paused:
+            return "paused"
+        return "max" if self.speed is None else "{}x".format(self.speed)
+
+
+class Simulation:
+    def __init__(self, airport: Airport, clock: SimClock | None = None, commands: CommandBus | None = None):
+        self.airport = airport
+        self.clock = clock if clock is not None else SimClock()
+        self.commands = commands if commands is not None else CommandBus()
+        self.ticks = 0
+        # traffic generator of the session, see new_session
+        self.traffic: "Traffic | None" = None
+        self._observers: list[Callable[["Simulation"], None]] = []
+
+    @property
+    def time(self) -> float:
+        # s of game time since the start
+        return self.ticks / TICK_RATE
+
+    def add_observer(self, observer: Callable[["Simulation"], None]):
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Callable[["Simulation"], None]):
+        self._observers.remove(observer)
+
+    def step(self, dt: float = TICK):
+        self.commands.drain(self.airport)
+        self.airport.update(dt)
+        for aircraft in [a for a in self.airport.aircraft if a.is_outside_game()]:
+            self.airport.remove_aircraft(aircraft)
+        self.ticks += 1
+        self.airport.scheduler.run_until(self.time)
+        for observer in self._observers:
+            observer(self)
+
+    def run(self, ticks: int, dt: float = TICK):
+        for _ in range(ticks):
+            self.step(dt)
+
+    def advance(self, real_dt: float) -> int:
+        # runs the ticks due after real_dt s of wall time, returns how many were run
+        if self.clock.speed is None and not self.clock.paused:
+            deadline = time.perf_counter() + MAX_SPEED_FRAME_BUDGET
+            ticks = 0
+            while time.perf_counter() < deadline:
+                self.step()
+                ticks += 1
+            return ticks
+        ticks = self.clock.ticks_due(real_dt)
+        self.run(ticks)
+        return ticks
+
+
+# Generates the traffic of the airport: parked aircraft start boarding one after another and inbound
+# aircraft are announced while there are free gates. Everything runs on the scheduler of the airport, so
+# traffic pauses and speeds up with the simulation.
+class Traffic:
+    def __init__(self, airport: Airport):
+        self.airport = airport
+        self._announced: list[Event] = []
+        self._queued_inbound = 0
+        self._separation: Event | None = None
+
+    def start(self, boarding: int = 3):
+        for _ in range(boarding):
+            self.start_boarding()
+        self.airport.scheduler.schedule(BOARDING_INTERVAL, self._boarding_cycle)
+
+    def start_boarding(self):
+        for aircraft in self.airport.aircraft:
+            if aircraft.timer is None and aircraft.get_status() == Status.PARKED:
+                aircraft.start_boarding(1, 60)
+                break
+
+    def _boarding_cycle(self):
+        self.start_boarding()
+        self.airport.scheduler.schedule(BOARDING_INTERVAL, self._boarding_cycle)
+
+    def __call__(self, sim: Simulation):
+        airport = self.airport
+        self._announced = [event for event in self._announced if event.is_pending()]
+        pending = len(self._announced) + self._queued_inbound
+        if (len(airport.gates) > len(airport.aircraft) + pending
+                and airport.number_of_landing_aircraft() < MAX_LANDING_AIRCRAFT
+                and pending < MAX_PENDING_INBOUND):
+            t = airport.rng.randint(1, 60)
+            print("Inbound aircraft in {} sec...".format(t))
+            self._announced.append(airport.scheduler.schedule(t, self._queue_inbound))
+
+    def _queue_inbound(self):
+        self._queued_inbound += 1
+        if self._separation is None or not self._separation.is_pending():
+            self._spawn_inbound()
+
+    def _spawn_inbound(self):
+        # inbound aircraft enter one at a time, the next one only after INBOUND_SEPARATION
+        if self._queued_inbound:
+            self._queued_inbound -= 1
+            self.airport.add_aircraft(AiAircraft.inbound_aircraft(self.airport))
+            self._separation = self.airport.scheduler.schedule(INBOUND_SEPARATION, self._spawn_inbound)
+
+
+# Plays the tower for batch runs: answers every request as soon as an aircraft makes it. Its choices are
+# input to the simulation like the ones of a player, so it has its own random numbers.
+class AutoController:
+    def __init__(self, seed: int | None = None):
+        self.rng = random.Random(seed)
+        self.instructions = 0
+
+    def __call__(self, sim: Simulation):
+        airport = sim.airport
+        for aircraft in airport.aircraft:
+            match aircraft.get_status():
+                case Status.READY_FOR_PUSHBACK:
+                    sim.commands.submit(aircraft.callsign, Instruction.PUSHBACK, "", "auto")
+                case Status.READY_FOR_TAXI:
+                    sim.commands.submit(aircraft.callsign, Instruction.TAXI, [airport.layout.runway], "auto")
+                case Status.READY_FOR_LINE_UP:
+                    sim.commands.submit(aircraft.callsign, Instruction.LINE_UP, "", "auto")
+                case Status.READY_FOR_TAKEOFF:
+                    sim.commands.submit(aircraft.callsign, Instruction.TAKEOFF, "", "auto")
+                case Status.READY_TO_LAND:
+                    sim.commands.submit(aircraft.callsign, Instruction.LAND, airport.layout.runway, "auto")
+                case Status.READY_FOR_GATE:
+                    gate = self.rng.choice(airport.gates)
+                    sim.commands.submit(aircraft.callsign, Instruction.TAXI, [gate.name.lower()], "auto")
+                case _:
+                    continue
+            self.instructions += 1
+
+
+def new_session(seed: int, size: tuple[int, int] = AIRPORT_SIZE, name: str | None = None,
+                commands: CommandBus | None = None, layout: str = DEFAULT_LAYOUT) -> Simulation:
+    # the airport with an aircraft at every gate and its traffic started, the same for the game, batch runs
+    # and replays, so a seed always leads to the same session. The airport is named like its layout unless a
+    # name is given.
+    airport_layout = load_layout(layout)
+    airport = Airport(name or airport_layout.name, size, seed, airport_layout)
+    for gate in airport.gates:
+        airport.add_aircraft(AiAircraft.parked_aircraft(airport, gate))
+    sim = Simulation(airport, commands=commands)
+    traffic = Traffic(airport)
+    sim.traffic = traffic
+    sim.add_observer(traffic)
+    traffic.start()
+    return sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ATC simulation without a display.")
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="write the session to this file, see recording.py")
+    parser.add_argument("--layout", default=DEFAULT_LAYOUT, help="layout file of the airport")
+    args = parser.parse_args()
+
+    sim = new_session(args.seed, layout=args.layout)
+    airport = sim.airport
+    controller = AutoController(args.seed)
+    sim.add_observer(controller)
+    recorder = None
+    if args.record:
+        from recording import Recorder
+        try:
+            recorder = Recorder(sim, args.record)
+        except RuntimeError as e:
+            parser.error(str(e))
+
+    start = time.perf_counter()
+    sim.run(args.ticks)
+    elapsed = time.perf_counter() - start
+    print("{} ticks in {:.2f} s ({:.0f} ticks/s), {} instructions, {} aircraft left".format(
+        sim.ticks, elapsed, sim.ticks / elapsed, controller.instructions, len(airport.aircraft)))
+    print("Commands:", sim.commands)
+    if recorder is not None:
+        recorder.close()
+        print("Recorded to", args.record)
+
+
+if __name__ == '__main__':
+    main()
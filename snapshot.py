@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import struct
+import time
+
+from aircraft import AiAircraft, Status
+from airport import Airport
+from command_bus import CommandBus
+from fleet import COLUMNS
+from layout import load_layout
+from scheduler import Event
+from simulation import Simulation, Traffic, new_session
+
+MAGIC = b"ATCS"
+VERSION = 4
+
+# magic, version, ticks, seed, airport width and height, scheduler time and sequence, followed by the name
+# and the path of the layout file
+HEADER = struct.Struct("<4sHIQHHdI")
+# version, the Mersenne Twister state and the next gaussian of random.Random.getstate()
+RNG_STATE = struct.Struct("<B625I?d")
+# status, status and speed to go back to after waiting, whether it turns towards its goals, fleet columns,
+# followed by the callsign, origin, destination, the boarding timer and the goals
+AIRCRAFT = struct.Struct("<BBd?" + "d" * len(COLUMNS))
+GOAL = struct.Struct("<dd")
+# time and sequence number, followed by the owner and the name of the method it calls
+EVENT = struct.Struct("<dI")
+# state and sequence number of an event something refers to
+EVENT_REF = struct.Struct("<BI")
+NO_EVENT, DONE, CANCELLED, PENDING = range(4)
+# what owns the method an event calls
+OWNER = struct.Struct("<B")
+TRAFFIC, AIRCRAFT_OWNER = range(2)
+# whether there is a traffic generator, the inbound aircraft it has queued
+TRAFFIC_STATE = struct.Struct("<?I")
+COUNT = struct.Struct("<I")
+
+
+def pack_string(value: str) -> bytes:
+    # length prefixed, the length as a COUNT
+    data = value.encode()
+    return COUNT.pack(len(data)) + data
+
+
+def unpack_string(data: bytes, offset: int) -> tuple[str, int]:
+    length = COUNT.unpack_from(data, offset)[0]
+    offset += COUNT.size
+    return data[offset:offset + length].decode(), offset + length
+
+
+def state_digest(airport: Airport) -> bytes:
+    # changes with any aircraft, position, status or random number drawn, so two simulations that took
+    # different paths are told apart
+    digest = hashlib.blake2b(digest_size=8)
+    for aircraft in airport.aircraft:
+        digest.update(aircraft.callsign.encode())
+        digest.update(struct.pack("<Bddd", aircraft.get_status().value, *aircraft.get_position(),
+                                  aircraft.get_altitude()))
+    digest.update(repr(airport.rng.getstate()).encode())
+    return digest.digest()
+
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fields: struct.Struct) -> tuple:
+        values = fields.unpack_from(self.data, self.offset)
+        self.offset += fields.size
+        return values
+
+    def count(self) -> int:
+        return self.unpack(COUNT)[0]
+
+    def string(self) -> str:
+        value, self.offset = unpack_string(self.data, self.offset)
+        return value
+
+
+def pack_event_ref(event: Event | None, sequences: dict[int, int]) -> bytes:
+    if event is None:
+        return EVENT_REF.pack(NO_EVENT, 0)
+    if event.is_pending():
+        return EVENT_REF.pack(PENDING, sequences[id(event)])
+    return EVENT_REF.pack(CANCELLED if event.cancelled else DONE, 0)
+
+
+def unpack_event_ref(reader: Reader, events: dict[int, Event]) -> Event | None:
+    state, sequence = reader.unpack(EVENT_REF)
+    if state == NO_EVENT:
+        return None
+    if state == PENDING:
+        return events[sequence]
+    # only whether it is still pending matters for events that already ran or were cancelled
+    event = Event(0.0, None, ())
+    event.done = state == DONE
+    event.cancelled = state == CANCELLED
+    return event
+
+
+def event_owner(sim: Simulation, event: Event) -> tuple[int, str] | None:
+    # type and callsign of the owner of the method an event calls, None for events of aircraft that left
+    # the airport, they can not change the simulation any more
+    owner = getattr(event.callback, "__self__", None)
+    if event.args:
+        raise RuntimeError("Cannot save the event calling {!r}".format(event.callback))
+    if owner is not None and owner is sim.traffic:
+        return TRAFFIC, ""
+    if isinstance(owner, AiAircraft):
+        return (AIRCRAFT_OWNER, owner.callsign) if sim.airport.callsigns.get(owner.callsign) is owner else None
+    raise RuntimeError("Cannot save the event calling {!r}".format(event.callback))
+
+
+# The state a simulation cannot be rebuilt without, between two ticks: the clock, the random numbers,
+# every aircraft with its goals, the pending events of the scheduler and the traffic generator.
+# Everything else, the ground map, the indexes, the fleet and the renderer, is derived from it on
+# restore. Events are stored as the owner and the name of the method they call.
+def save(sim: Simulation) -> bytes:
+    airport = sim.airport
+    scheduler = airport.scheduler
+    if airport.seed is None:
+        raise RuntimeError("Only simulations of a seeded airport can be saved")
+    parts = [HEADER.pack(MAGIC, VERSION, sim.ticks, airport.seed, airport.width, airport.height,
+                         scheduler.time, scheduler._sequence), pack_string(airport.name),
+             pack_string(airport.layout.path)]
+    version, state, gauss = airport.rng.getstate()
+    parts.append(RNG_STATE.pack(version, *state, gauss is not None, gauss or 0.0))
+
+    parts.append(COUNT.pack(len(airport._reserved_callsigns)))
+    parts.extend(pack_string(callsign) for callsign in sorted(airport._reserved_callsigns))
+
+    events = []
+    for event_time, sequence, event in sorted(scheduler._queue, key=lambda item: item[1]):
+        if event.is_pending():
+            owner = event_owner(sim, event)
+            if owner is not None:
+                events.append((event_time, sequence, owner, event.callback.__name__))
+    sequences = {id(event): sequence for _, sequence, event in scheduler._queue}
+    parts.append(COUNT.pack(len(events)))
+    for event_time, sequence, (owner_type, callsign), method in events:
+        parts.append(EVENT.pack(event_time, sequence) + OWNER.pack(owner_type) + pack_string(callsign)
+                     + pack_string(method))
+
+    parts.append(COUNT.pack(len(airport.aircraft)))
+    for aircraft in airport.aircraft:
+        backup_status, backup_speed = aircraft.backup_state
+        parts.append(AIRCRAFT.pack(aircraft.get_status().value, backup_status.value, backup_speed,
+                                   aircraft._turn_towards,
+                                   *(getattr(aircraft._fleet, column)[aircraft._slot] for column in COLUMNS)))
+        parts.append(pack_string(aircraft.callsign))
+        parts.append(pack_string(aircraft.origin or "") + pack_string(aircraft.destination or ""))
+        parts.append(pack_event_ref(aircraft.timer, sequences))
+        parts.append(COUNT.pack(len(aircraft.get_goals())))
+        parts.extend(GOAL.pack(*goal) for goal in aircraft.get_goals())
+
+    traffic = sim.traffic
+    parts.append(TRAFFIC_STATE.pack(traffic is not None, traffic._queued_inbound if traffic else 0))
+    if traffic is not None:
+        parts.append(pack_event_ref(traffic._separation, sequences))
+        announced = [event for event in traffic._announced if event.is_pending()]
+        parts.append(COUNT.pack(len(announced)))
+        parts.extend(pack_event_ref(event, sequences) for event in announced)
+    return b"".join(parts)
+
+
+def restore(data: bytes, commands: CommandBus | None = None) -> Simulation:
+    # a running simulation in the state of the snapshot, observers other than the traffic generator
+    # have to be added again
+    reader = Reader(data)
+    magic, version, ticks, seed, width, height, scheduler_time, sequence = reader.unpack(HEADER)
+    if magic != MAGIC or version != VERSION:
+        raise RuntimeError("Not a snapshot of version {}".format(VERSION))
+    name = reader.string()
+    airport = Airport(name, (width, height), seed, load_layout(reader.string()))
+    rng_version, *state, has_gauss, gauss = reader.unpack(RNG_STATE)
+    airport.rng.setstate((rng_version, tuple(state), gauss if has_gauss else None))
+    airport._reserved_callsigns = {reader.string() for _ in range(reader.count())}
+
+    sim = Simulation(airport, commands=commands)
+    sim.ticks = ticks
+    scheduler = airport.scheduler
+    scheduler.time = scheduler_time
+    scheduler._sequence = sequence
+    # the callbacks are bound once their owners exist
+    scheduled = []
+    for _ in range(reader.count()):
+        event_time, event_sequence = reader.unpack(EVENT)
+        owner_type = reader.unpack(OWNER)[0]
+        scheduled.append((event_time, event_sequence, owner_type, reader.string(), reader.string()))
+    events = {event_sequence: Event(event_time, None, ()) for event_time, event_sequence, *_ in scheduled}
+
+    for _ in range(reader.count()):
+        status, backup_status, backup_speed, turn_towards, *columns = reader.unpack(AIRCRAFT)
+        aircraft = AiAircraft(reader.string(), (0, 0), 0, 0, 0, Status(status), airport)
+        for column, value in zip(COLUMNS, columns):
+            getattr(aircraft._fleet, column)[aircraft._slot] = value
+        aircraft.backup_state = (Status(backup_status), backup_speed)
+        aircraft._turn_towards = turn_towards
+        aircraft.origin = reader.string() or None
+        aircraft.destination = reader.string() or None
+        aircraft.timer = unpack_event_ref(reader, events)
+        aircraft._goal = [reader.unpack(GOAL) for _ in range(reader.count())]
+        airport.add_aircraft(aircraft)
+
+    has_traffic, queued_inbound = reader.unpack(TRAFFIC_STATE)
+    if has_traffic:
+        traffic = Traffic(airport)
+        traffic._queued_inbound = queued_inbound
+        traffic._separation = unpack_event_ref(reader, events)
+        traffic._announced = [unpack_event_ref(reader, events) for _ in range(reader.count())]
+        sim.traffic = traffic
+        sim.add_observer(traffic)
+
+    for event_time, event_sequence, owner_type, callsign, method in scheduled:
+        owner = sim.traffic if owner_type == TRAFFIC else airport.callsigns[callsign]
+        event = events[event_sequence]
+        event.callback = getattr(owner, method)
+        scheduler._queue.append((event_time, event_sequence, event))
+    # sorted by time and sequence, which is a valid heap
+    scheduler._queue.sort(key=lambda item: item[:2])
+    return sim
+
+
+def write(sim: Simulation, path: str):
+    with open(path, "wb") as file:
+        file.write(save(sim))
+
+
+def read(path: str, commands: CommandBus | None = None) -> Simulation:
+    with open(path, "rb") as file:
+        return restore(file.read(), commands)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot a simulation and check that the restored copy "
+                                                 "runs on like the original.")
+    parser.add_argument("--ticks", type=int, default=20000, help="ticks before the snapshot")
+    parser.add_argument("--after", type=int, default=20000, help="ticks both simulations run after it")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sim = new_session(args.seed)
+    sim.run(args.ticks)
+    start = time.perf_counter()
+    data = save(sim)
+    saved = time.perf_counter() - start
+    start = time.perf_counter()
+    copy = restore(data)
+    restored = time.perf_counter() - start
+    print("{} aircraft, {} events: {} bytes, saved in {:.2f} ms, restored in {:.2f} ms".format(
+        len(sim.airport.aircraft), len(sim.airport.scheduler), len(data), saved * 1000, restored * 1000))
+
+    sim.run(args.after)
+    copy.run(args.after)
+    same = state_digest(sim.airport) == state_digest(copy.airport) and save(sim) == save(copy)
+    print("After {} more ticks the restored simulation {}".format(
+        args.after, "matches the original" if same else "differs from the original"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import heapq
+from typing import Callable, Hashable, Iterator
+
+
+# Uniform grid over 2D positions. Items only move between buckets when they cross a cell border, so keeping
+# the index up to date is cheap, and a proximity query only looks at the cells overlapping the query box.
+class SpatialHash:
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], set[Hashable]] = {}
+        self._item_cells: dict[Hashable, tuple[int, int]] = {}
+        # min/max cell coordinates ever occupied, may be larger than needed after removals
+        self._bounds: list[int] | None = None
+
+    def __len__(self):
+        return len(self._item_cells)
+
+    def __contains__(self, item: Hashable):
+        return item in self._item_cells
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def _add(self, item: Hashable, cell: tuple[int, int]):
+        self._item_cells[item] = cell
+        self._cells.setdefault(cell, set()).add(item)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], cell[0])
+            bounds[1] = min(bounds[1], cell[1])
+            bounds[2] = max(bounds[2], cell[0])
+            bounds[3] = max(bounds[3], cell[1])
+
+    def insert(self, item: Hashable, position: tuple[float, float]):
+        self._add(item, self._cell(position[0], position[1]))
+
+    def remove(self, item: Hashable):
+        cell = self._item_cells.pop(item)
+        bucket = self._cells[cell]
+        bucket.discard(item)
+        if not bucket:
+            del self._cells[cell]
+
+    def move(self, item: Hashable, position: tuple[float, float]):
+        cell = self._cell(position[0], position[1])
+        old = self._item_cells.get(item)
+        if old == cell:
+            return
+        if old is not None:
+            self.remove(item)
+        self._add(item, cell)
+
+    def query(self, position: tuple[float, float], radius: float) -> Iterator[Hashable]:
+        min_x, min_y = self._cell(position[0] - radius, position[1] - radius)
+        max_x, max_y = self._cell(position[0] + radius, position[1] + radius)
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket:
+                    yield from bucket
+
+    def _ring(self, center: tuple[int, int], r: int) -> Iterator[tuple[int, int]]:
+        # cells at Chebyshev distance r from center, clipped to the occupied bounds
+        cx, cy = center
+        min_x, min_y, max_x, max_y = self._bounds
+        for y in (cy - r, cy + r) if r else (cy,):
+            if min_y <= y <= max_y:
+                for x in range(max(cx - r, min_x), min(cx + r, max_x) + 1):
+                    yield x, y
+        for x in (cx - r, cx + r) if r else ():
+            if min_x <= x <= max_x:
+                for y in range(max(cy - r + 1, min_y), min(cy + r - 1, max_y) + 1):
+                    yield x, y
+
+    def nearest(self, position: tuple[float, float], k: int,
+                position_of: Callable[[Hashable], tuple[float, float]]) -> list[Hashable]:
+        # Manhattan distance, ties are broken by the item itself so results do not depend on insertion order.
+        # Searches rings of cells around the query cell. Everything outside ring r is at least
+        # r * cell_size away, so the search stops as soon as the k best candidates are closer than that.
+        if not self._item_cells or k <= 0:
+            return []
+        center = cx, cy = self._cell(position[0], position[1])
+        min_x, min_y, max_x, max_y = self._bounds
+        r = max(0, min_x - cx, cx - max_x, min_y - cy, cy - max_y)
+        best: list[tuple[float, Hashable]] = []
+        seen = 0
+        while seen < len(self._item_cells):
+            for cell in self._ring(center, r):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                seen += len(bucket)
+                for item in bucket:
+                    x, y = position_of(item)
+                    best.append((abs(x - position[0]) + abs(y - position[1]), item))
+            if len(best) >= k:
+                best = heapq.nsmallest(k, best)
+                if best[-1][0] <= r * self.cell_size:
+                    break
+            r += 1
+        return [item for _, item in sorted(best)[:k]]
+
+    def clear(self):
+        self._cells.clear()
+        self._item_cells.clear()
+        self._bounds = None
@@ -0,0 +1,278 @@
+import argparse
+import array
+import collections
+import json
+import math
+import os
+import queue
+import threading
+import time
+import wave
+from typing import Iterator
+
+from command_bus import LATENCY_SAMPLES, CommandBus
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+
+SAMPLE_RATE = 16000  # Hz, 16 bit mono, what offline speech models expect
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FRAME_BYTES = FRAME_SAMPLES * 2
+
+MIN_ENERGY = 300  # RMS below which a frame is never speech
+ENERGY_RATIO = 3.0  # a frame is speech when it is this much louder than the noise floor
+NOISE_ADAPTATION = 0.05  # how fast the noise floor follows the frames that are not speech
+SPEECH_START_MS = 90  # speech needed to start an utterance, shorter noises are ignored
+SPEECH_END_MS = 600  # silence that ends an utterance
+PRE_ROLL_MS = 300  # audio kept from before the start, so the first syllable is not cut off
+MAX_UTTERANCE_MS = 10000
+
+VOSK_MODEL = "resources/vosk-model"
+
+
+def frame_energy(frame: bytes) -> float:
+    samples = array.array("h", frame)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+class Utterance:
+    def __init__(self, audio: bytes, started: float, ended: float):
+        self.audio = audio
+        # perf_counter of the first and the last frame of speech
+        self.started = started
+        self.ended = ended
+
+
+# Energy based voice activity detection. Frames much louder than the noise floor are speech, an
+# utterance starts after SPEECH_START_MS of speech and ends after SPEECH_END_MS of silence.
+class Segmenter:
+    def __init__(self):
+        self.noise = MIN_ENERGY / ENERGY_RATIO
+        self.reset()
+
+    def reset(self):
+        self._frames: list[bytes] = []
+        self._pre_roll: collections.deque[bytes] = collections.deque(maxlen=PRE_ROLL_MS // FRAME_MS)
+        self._voiced = 0
+        self._silent = 0
+        self._started = 0.0
+        self._last_voiced = 0.0
+
+    def is_speech(self, frame: bytes) -> bool:
+        energy = frame_energy(frame)
+        speech = energy > max(MIN_ENERGY, self.noise * ENERGY_RATIO)
+        if not speech:
+            self.noise += (energy - self.noise) * NOISE_ADAPTATION
+        return speech
+
+    def feed(self, frame: bytes, now: float) -> Utterance | None:
+        # the utterance that ended with this frame, if any
+        speech = self.is_speech(frame)
+        if not self._frames:
+            # waiting for speech to start
+            self._pre_roll.append(frame)
+            self._voiced = self._voiced + 1 if speech else 0
+            if self._voiced == 1:
+                self._started = now
+            if self._voiced * FRAME_MS >= SPEECH_START_MS:
+                self._frames = list(self._pre_roll)
+                self._last_voiced = now
+            return None
+        self._frames.append(frame)
+        if speech:
+            self._silent = 0
+            self._last_voiced = now
+        else:
+            self._silent += 1
+        if self._silent * FRAME_MS < SPEECH_END_MS and len(self._frames) * FRAME_MS < MAX_UTTERANCE_MS:
+            return None
+        utterance = Utterance(b"".join(self._frames), self._started, self._last_voiced)
+        self.reset()
+        return utterance
+
+
+# Audio sources yield frames of FRAME_SAMPLES 16 bit mono samples at SAMPLE_RATE until they are closed.
+class MicrophoneSource:
+    def __init__(self):
+        self._closed = threading.Event()
+
+    def frames(self) -> Iterator[bytes]:
+        import speech_recognition as sr
+        with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_SAMPLES) as microphone:
+            while not self._closed.is_set():
+                yield microphone.stream.read(FRAME_SAMPLES)
+
+    def close(self):
+        self._closed.set()
+
+
+# Replays a recording as if it came from the microphone, in real time unless realtime is False.
+class WavSource:
+    def __init__(self, path: str, realtime: bool = True):
+        self.path = path
+        self.realtime = realtime
+        self._closed = threading.Event()
+
+    def frames(self) -> Iterator[bytes]:
+        with wave.open(self.path, "rb") as recording:
+            if (recording.getnchannels(), recording.getsampwidth(), recording.getframerate()) != (1, 2, SAMPLE_RATE):
+                raise RuntimeError("{} is not 16 bit mono at {} Hz".format(self.path, SAMPLE_RATE))
+            start = time.perf_counter()
+            count = 0
+            while not self._closed.is_set():
+                frame = recording.readframes(FRAME_SAMPLES)
+                if len(frame) < FRAME_BYTES:
+                    break
+                count += 1
+                if self.realtime:
+                    time.sleep(max(0.0, start + count * FRAME_MS / 1000 - time.perf_counter()))
+                yield frame
+        # silence after the end, so the last utterance of the recording ends
+        for _ in range(SPEECH_END_MS // FRAME_MS + 1):
+            yield bytes(FRAME_BYTES)
+
+    def close(self):
+        self._closed.set()
+
+
+# Recognizers turn the audio of an utterance into text, "" if nothing was understood.
+class VoskRecognizer:
+    def __init__(self, model_path: str = VOSK_MODEL):
+        import vosk
+        if not os.path.isdir(model_path):
+            raise RuntimeError("No speech model at {}, download one from https://alphacephei.com/vosk/models"
+                               .format(model_path))
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self._model = vosk.Model(model_path)
+
+    def recognize(self, audio: bytes) -> str:
+        recognizer = self._vosk.KaldiRecognizer(self._model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(audio)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+# Stands in for a speech engine when replaying a recording with a known transcript: the n-th utterance
+# is recognized as the n-th line.
+class TranscriptRecognizer:
+    def __init__(self, lines: list[str]):
+        self._lines = collections.deque(line.strip() for line in lines if line.strip())
+
+    def recognize(self, audio: bytes) -> str:
+        return self._lines.popleft() if self._lines else ""
+
+
+# Continuous voice input: a capture thread reads the source without pause and cuts it into utterances,
+# a recognizer thread turns them into commands on the bus. Capture never waits for recognition, so
+# nothing is lost while an utterance is recognized. Commands are given at the end of their utterance,
+# the latency of their feedback is the one from the end of speech to the applied instruction.
+class SpeechPipeline:
+    def __init__(self, source, recognizer, commands: CommandBus):
+        self.source = source
+        self.recognizer = recognizer
+        self.commands = commands
+        self.segmenter = Segmenter()
+        # while False audio is still read but thrown away
+        self.listening = True
+        self.recognition_times: collections.deque[float] = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._utterances: queue.Queue[Utterance | None] = queue.Queue()
+        self._threads = [threading.Thread(target=self._capture, daemon=True),
+                         threading.Thread(target=self._recognize, daemon=True)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self.source.close()
+
+    def join(self, timeout: float | None = None):
+        # returns once the source ended and every utterance was recognized
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _capture(self):
+        try:
+            for frame in self.source.frames():
+                if not self.listening:
+                    self.segmenter.reset()
+                    continue
+                utterance = self.segmenter.feed(frame, time.perf_counter())
+                if utterance is not None:
+                    self._utterances.put(utterance)
+        except (OSError, RuntimeError) as e:
+            print("Voice input stopped:", e)
+        finally:
+            self._utterances.put(None)
+
+    def _recognize(self):
+        while (utterance := self._utterances.get()) is not None:
+            start = time.perf_counter()
+            try:
+                text = self.recognizer.recognize(utterance.audio)
+            except Exception as e:
+                # an engine error loses this utterance, not the voice input of the session
+                print("Could not recognize audio:", e)
+                continue
+            self.recognition_times.append(time.perf_counter() - start)
+            if not text:
+                print("Could not understand audio")
+                continue
+            try:
+                command = self.commands.submit(*Parser(Lexer(text)).valid(), "voice", issued=utterance.ended)
+            except RuntimeError as e:
+                print("Could not parse '{}': {}".format(text, e))
+                continue
+            print("Heard '{}' as {}, {:.0f} ms after speech".format(
+                text, command, (time.perf_counter() - utterance.ended) * 1000))
+
+    def __str__(self):
+        if not self.recognition_times:
+            return "nothing recognized"
+        ordered = sorted(self.recognition_times)
+        return "{} utterances, recognition p50 {:.0f} ms max {:.0f} ms".format(
+            len(ordered), ordered[len(ordered) // 2] * 1000, ordered[-1] * 1000)
+
+
+def create_pipeline(commands: CommandBus) -> SpeechPipeline | None:
+    # microphone and offline recognizer, None if there is no speech engine or microphone
+    try:
+        recognizer = VoskRecognizer()
+    except (ImportError, RuntimeError) as e:
+        print("Voice commands disabled:", e)
+        return None
+    try:
+        # the capture thread would only fail once it runs, without PyAudio sr.Microphone raises AttributeError
+        import speech_recognition as sr
+        with sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_SAMPLES):
+            pass
+    except (ImportError, AttributeError, AssertionError, OSError) as e:
+        print("Voice commands disabled, no microphone:", e)
+        return None
+    return SpeechPipeline(MicrophoneSource(), recognizer, commands)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording through the voice pipeline")
+    parser.add_argument("recording", help="16 bit mono WAV at {} Hz".format(SAMPLE_RATE))
+    parser.add_argument("--transcript", help="one line per utterance, recognized instead of running the model")
+    parser.add_argument("--fast", action="store_true", help="do not replay in real time")
+    args = parser.parse_args()
+
+    if args.transcript:
+        with open(args.transcript) as file:
+            recognizer = TranscriptRecognizer(file.readlines())
+    else:
+        recognizer = VoskRecognizer()
+    commands = CommandBus()
+    pipeline = SpeechPipeline(WavSource(args.recording, not args.fast), recognizer, commands)
+    pipeline.start()
+    pipeline.join()
+    print(pipeline)
+    print("{} commands".format(len(commands)))
+
+
+if __name__ == '__main__':
+    main()
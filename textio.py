@@ -1,8 +1,7 @@
-import re
-
 import pygame as pg
-import queue
 
+import assets
+from command_bus import CommandBus
 from compiler.lexer import Lexer
 from compiler.parser import Parser
 
@@ -13,15 +12,15 @@ class InputBox:
     COLOR_ACTIVE = pg.Color('dodgerblue2')
     FONT = None
 
-    def __init__(self, x: int, y: int, w: int, h: int, instructions: queue.Queue, text:str ="",):
+    def __init__(self, x: int, y: int, w: int, h: int, commands: CommandBus, text:str ="",):
         if InputBox.FONT is None:
-            InputBox.FONT = pg.font.SysFont("Helvetica", 20)
+            InputBox.FONT = assets.cache.font(assets.FONT_NAME, 20)
         self.rect = pg.Rect(x, y, w, h)
         self.color = InputBox.COLOR_INACTIVE
         self.text = text
         self.txt_surface = InputBox.FONT.render(text, True, pg.Color('white'))
         self.active = False
-        self.instructions = instructions
+        self.commands = commands
 
     def handle_event(self, event):
         if event.type == pg.MOUSEBUTTONDOWN:
@@ -36,9 +35,8 @@ class InputBox:
         if event.type == pg.KEYDOWN:
             if self.active:
                 if event.key == pg.K_RETURN:
-                    parser = Parser(Lexer(re.sub(r"([a-zA-Z]+)(\d+)", r"\1 \2", self.text)))
                     try:
-                        self.instructions.put(parser.valid())
+                        self.commands.submit(*Parser(Lexer(self.text)).valid(), "input box")
                     except RuntimeError as e:
                         print("Unknown command", e.args)
                     self.text = ''
@@ -54,8 +52,8 @@ class InputBox:
         width = max(200, self.txt_surface.get_width()+10)
         self.rect.w = width
 
-    def draw(self, screen):
+    def draw(self, screen) -> pg.Rect:
         # Blit the text.
-        screen.blit(self.txt_surface, (self.rect.x+5, self.rect.y+5))
+        text_rect = screen.blit(self.txt_surface, (self.rect.x+5, self.rect.y+5))
         # Blit the rect.
-        pg.draw.rect(screen, self.color, self.rect, 2)
+        return pg.draw.rect(screen, self.color, self.rect, 2).union(text_rect)